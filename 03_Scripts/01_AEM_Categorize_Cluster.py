@@ -28,7 +28,8 @@ from sklearn.cluster import AgglomerativeClustering, DBSCAN, SpectralClustering
 
 import sys
 sys.path.append('./')
-from aem_read import read_xyz, aem_wide2long
+from aem_read import read_xyz, aem_wide2long, flag_saturated
+from texture_map import map_textures, report_unknown_textures
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
@@ -142,6 +143,12 @@ aem_long = aem_wide2long(aem_wide,
                          id_col_prefixes=['RHO_I', 'RHO_I_STD', 'SIGMA_I', 'DEP_TOP', 'DEP_BOT', 'THK', 'THK_STD', 'DEP_BOT_STD'],
                          line_col='LINE_NO')
 
+# Saturated pixels: bottom at or below the kriged water table elevation of the sounding (computed once, reused)
+sounding_wl = aem_shp.set_index(['LINE_NO', 'FID'])['ok_wl']
+sounding_wl = sounding_wl[~sounding_wl.index.duplicated()]
+aem_long['ok_wl'] = sounding_wl.reindex(pd.MultiIndex.from_frame(aem_long[['LINE_NO', 'FID']])).to_numpy()
+aem_long = flag_saturated(aem_long, 'ok_wl', criterion='bottom', elev_col='ELEVATION')
+
 # Calculate Elevations for well logs
 litho['ELEV_TOP'] = litho['GROUND_SURFACE_ELEVATION_m'] - litho['LITH_TOP_DEPTH_m']
 litho['ELEV_BOT'] = litho['GROUND_SURFACE_ELEVATION_m'] - litho['LITH_BOT_DEPTH_m']
@@ -151,6 +158,8 @@ litho['overlap'] = False
 # -------------------------------------------------------------------------------------------------------------------- #
 lith_use = litho.copy()
 lith_use['UID'] = range(1, len(lith_use) + 1)
+lith_use['Cluster'] = map_textures(lith_use['Texture'], 'Cluster', default=True)
+report_unknown_textures(lith_use['Texture'])
 
 # Limit Distance
 aem_wells_use = aem_hqwells_shp[aem_hqwells_shp['dist'] <= 800.0]  # aem_hqwells_shp.copy()
@@ -162,10 +171,9 @@ overlapping_data = []
 for id, loc in tqdm(aem_wells_use.iterrows(), total=aem_wells_use.shape[0]):
     log = lith_use[lith_use['WELL_INFO_ID'] == id].copy()
     paem_long = aem_long[(aem_long['LINE_NO'] == loc['LINE_NO']) & (aem_long['FID'] == loc['FID'])]
+    paem_long = paem_long[paem_long['SAT']]
 
     for j, pixel in paem_long.iterrows():
-        if (pixel['ELEVATION'] - pixel['DEP_BOT']) > loc['ok_wl']: continue
-
         log['overlap'] = (log['LITH_BOT_DEPTH_m'] - pixel['DEP_TOP'] > 0) & (pixel['DEP_BOT'] - log['LITH_TOP_DEPTH_m'] >= 0)
 
         overlapping_logs = log[log['overlap']]
@@ -194,13 +202,10 @@ for id, loc in tqdm(aem_wells_use.iterrows(), total=aem_wells_use.shape[0]):
 # Convert the list of dictionaries to a DataFrame
 overlapping_df = pd.DataFrame(overlapping_data)
 
-# Some forced classification
-overlapping_df.loc[overlapping_df['Texture']=='shale','Classification']    = 'fine'
-overlapping_df.loc[overlapping_df['Texture']=='top soil','Classification'] = 'fine'
-#overlapping_df.loc[overlapping_df['Texture']=='rock','Classification']     = 'coarse'
-overlapping_df = overlapping_df.loc[overlapping_df['Texture']!='rock']
-overlapping_df = overlapping_df.loc[overlapping_df['Texture']!='top soil']
-overlapping_df = overlapping_df.loc[overlapping_df['Texture']!='cobbles']
+# Some forced classification, and textures left out of the clustering (texture_map.TEXTURE_TABLE)
+forced = map_textures(overlapping_df['Texture'], 'Classification')
+overlapping_df['Classification'] = forced.where(forced.notna(), overlapping_df['Classification'])
+overlapping_df = overlapping_df.loc[map_textures(overlapping_df['Texture'], 'Cluster', default=True)]
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # Great time to see the mess:
@@ -444,21 +449,20 @@ for id, loc in tqdm(aem_wells_use.iterrows()):
 
     # Get log corresponding to nearest AEM point data (from wide data, b/c slightly easier to work with)
     paem_long = aem_long[(aem_long['LINE_NO']==loc['LINE_NO']) & (aem_long['FID']==loc['FID'])]
+    paem_long = paem_long[paem_long['SAT']]
 
     # Calc distance
     log_pixel_dist = loc
 
     # Loop over pixels below the water table
     for j, pixel in paem_long.iterrows():
-        if (pixel['ELEVATION']-pixel['DEP_BOT']) > loc['ok_wl']:
-            continue
         # Get litho overlaps
         log['overlap'] = (log['LITH_BOT_DEPTH_m'] - pixel['DEP_TOP'] > 0) & (pixel['DEP_BOT'] - log['LITH_TOP_DEPTH_m'] >= 0)
         if log['overlap'].any():
             thicks = np.zeros(nmeta)
             # Need to add up thickness for each cluster
             for k, intv in log[log.overlap].iterrows():
-                if intv['Texture'] in ['top soil', 'rock', 'cobbles', 'unknown'] : continue
+                if not intv['Cluster']: continue
                 cluster = overlapping_df.loc[overlapping_df.UID == intv.UID, 'cluster'].iloc[0]
                 thick = min(pixel['DEP_BOT'], intv['LITH_BOT_DEPTH_m']) - max(pixel['DEP_TOP'], intv['LITH_TOP_DEPTH_m'])
                 thicks[cluster-1] += thick
@@ -1,5 +1,5 @@
 import matplotlib
-matplotlib.use('TkAgg')
+matplotlib.use('Agg')
 
 import numpy as np
 import pandas as pd
@@ -15,8 +15,10 @@ os.chdir("./03_Scripts/")
 
 import sys
 sys.path.append('./')
-from aem_plot.utils import df2rectangles, plot_slice_rect, plot_line_by_depth, plot_wl
-from aem_read import read_xyz, aem_wide2long, calc_line_geometry
+from aem_plot.utils import df2polyverts
+from aem_plot.batch import render_sections
+from spatial_io import write_spatial
+from aem_read import read_xyz, aem_wide2long, calc_line_geometry, read_texture_probs, align_texture_probs
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
@@ -50,6 +52,19 @@ bedrock_thk_cutoff = 75
 
 use_mf_top_bot = False
 
+# Worker processes for rendering line figures (None = all cores)
+n_plot_procs = None
+
+# Only re-render lines whose plotted data or styling changed since the last run (see render_manifest.json)
+skip_unchanged_plots = True
+
+# Draw sections as resampled images instead of one polygon per pixel (faster, smaller files),
+# e.g. {'method': 'nearest'} or {'method': 'bilinear', 'dz': 1.0}. None = polygons
+plot_raster = None
+
+# Spatial output formats: 'parquet' (GeoParquet), 'gpkg' (GeoPackage), 'shp' (ESRI Shapefile)
+export_formats = ['parquet', 'gpkg']
+
 # Models
 base_dir = mod_dir / 'SVIHM_MF_orig'
 
@@ -92,8 +107,8 @@ def mf_thickness(x, mf):
 print('Reading Data...')
 line_bot = pd.read_csv(line_bot_file)
 aem_wide = read_xyz(aem_sharp_file, 26, x_col='UTMX', y_col='UTMY', delim_whitespace=True)
-tprobs = pd.read_csv(aem_tprobs_file, sep='\\s+')
-tex_classes = tprobs.columns[7:].tolist()
+tprobs = read_texture_probs(aem_tprobs_file)
+tex_classes = tprobs.columns[8:].tolist()
 #litho = pd.read_csv(aem_litho_file)
 
 # Read in CF file (has Ramboll est. bottoms)
@@ -114,11 +129,6 @@ aem_wide = aem_wide[aem_wide['LINE_NO'].isin(aem_shp['LINE_NO'])]
 aem_wide = aem_wide.merge(cf_bot, how='left', left_on='FID', right_on='ModIndex')
 aem_wide['bot_cf'] = aem_wide['ELEVATION'] - aem_wide['IntvEnd']
 
-#-- Split line no & fid in rholog
-tprobs[['LINE_NO','FID']] = tprobs['Line'].str.split('_', expand=True)
-tprobs['LINE_NO'] = tprobs['LINE_NO'].map(int)
-tprobs['FID'] = tprobs['FID'].map(int)
-
 print('Loading MODFLOW Model...')
 mf_org = flopy.modflow.Modflow.load(base_dir / 'SVIHM.nam', load_only=['dis'], version='mfnwt')
 mf_org.modelgrid.set_coord_info(xoff=499977, yoff=4571330)
@@ -143,10 +153,8 @@ aem_long = aem_wide2long(aem_wide,
                          line_col='LINE_NO')
 
 #-- Merge in data from rholog
-aem_long = aem_long.merge(tprobs[['LINE_NO','FID','Depth'] + tex_classes],
-                          how='left',
-                          left_on=['LINE_NO','FID','DEP_BOT'],
-                          right_on=['LINE_NO','FID','Depth'])
+aem_long = aem_long.reset_index(drop=True)
+aem_long[tex_classes] = align_texture_probs(aem_long, tprobs, tex_classes)
 
 #-- Add a bottom & Midpoint elevation column
 aem_long['BOT_ELEV'] = aem_long['ELEVATION'] - aem_long['DEP_BOT']
@@ -260,20 +268,8 @@ print('Bottom Scraped.')
 # -------------------------------------------------------------------------------------------------------------------- #
 # Do some plotting
 
-#-- Get Rectangles
-aem_long['AEMRect'] = df2rectangles(aem_long, x_col='LINE_DIST', y_col='BOT_ELEV',
-                               xthk_col='LINE_WIDTH', ythk_col='THK')
-
 print('Starting Plotting...')
 #plt.style.use('seaborn-v0_8-dark')
-fig, axd = plt.subplot_mosaic([['p1', 'map'], ['p2', 'map'], ['p3', 'map'], ['p4', 'map'], ['p5', 'map'], ['p6', 'map']],
-                              gridspec_kw={'width_ratios': [6, 2]},
-                              constrained_layout=True, figsize=(14, 10))
-
-#-- Setup map
-lmap = svihm_domain.plot(color='lightgray', ax=axd['map'])
-lmap = aem_line_shp.plot(color='darkgray', ax=axd['map'])
-lmap.set_axis_off()
 prob_cmaps = ['Blues', 'Greens', 'Oranges', 'Purples', 'Reds']
 
 # lne = 100701
@@ -282,8 +278,17 @@ prob_cmaps = ['Blues', 'Greens', 'Oranges', 'Purples', 'Reds']
 # Last minute rename of Tex Classes
 tex_classes_use = ['Fine-grained', 'Mixed Fine', 'Sand', 'Mixed Coarse', 'Very Coarse']
 
-#-- Loop over lines plotting
-for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Plotting Line: '):
+#-- Figure layout (each render worker builds it once, then updates it in place for every line)
+panels = [{'cmap': 'turbo', 'colorbar_label': 'Resistivity (ohm-m)'}]
+panels += [{'cmap': prob_cmaps[i], 'clim': (0, 1), 'colorbar_label': f'{tex_classes_use[i]} Prob.'}
+           for i in range(len(tex_classes))]
+overlays = [('doi', 'k:', 0.9), ('bot_point', 'r:', 0.9), ('bot_line', 'r--', 0.9),
+            # ('bot_cf', 'm--', 0.9), ('bot1', 'g--', 0.9),
+            ('bot2', 'g--', 0.9)]
+
+#-- Loop over lines collecting plot data, figures are rendered in parallel below
+jobs = []
+for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Preparing Line: '):
     botdf = bottoms_df[bottoms_df['SUBLINE_NO']==lne]
     #ylim = (fj_sub.BOT_ELEV.min(), fj_sub.ELEVATION.max())
     if use_mf_top_bot:
@@ -298,62 +303,41 @@ for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Plotting Line: '):
     line_max += 0.05 * np.sign(line_max)
     line_min -= 0.05 * np.sign(line_min)
 
-    ln_list = []
-    cb_list = []
-
-    #-- Rho
-    ln1, cb = plot_slice_rect(fig, axd['p1'], rect=df.AEMRect, values=df.RHO_I, cmap='turbo',
-                    title=f'Flight Line: {lne}',
-                    xlim=(line_min, line_max),
-                    ylim=ylim,
-                    ylabel='Elevation (m)',
-                    colorbar_label='Resistivity (ohm-m)', hide_xticks=True)
-    cb_list.append(cb)
-    #plot_doi(axd['p1'], fj_sub.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_STANDARD', 'ELEVATION', fmt='k--')
-    plot_line_by_depth(axd['p1'], df.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_CONSERVATIVE', 'ELEVATION', fmt='k:')
-    plot_wl(axd['p1'], botdf, 'LINE_DIST', 'BOT_EST_POINT', None, fmt='r:', width_col='LINE_WIDTH', center=True)
-    plot_wl(axd['p1'], botdf, 'LINE_DIST', 'BOT_EST_LNE', None, fmt='r--', width_col='LINE_WIDTH', center=True)
-    # plot_wl(axd['p1'], fj_sub, 'LINE_DIST', 'bot_cf', None, fmt='m--', width_col='LINE_WIDTH', center=True)
-    # plot_wl(axd['p1'], fj_sub, 'LINE_DIST', 'bot1', None, fmt='g--', width_col='LINE_WIDTH', center=True)
-    plot_wl(axd['p1'], df, 'LINE_DIST', 'bot2', None, fmt='g--', width_col='LINE_WIDTH', center=True)
-
-    #-- Loop over Textures
-    for i, tex in enumerate(tex_classes):
-        ln, cb = plot_slice_rect(fig, axd[f'p{i+2}'], rect=df.AEMRect, values=df[tex], cmap=prob_cmaps[i],
-                        xlim=(line_min, line_max),
-                        ylim=ylim,
-                        ylabel='Elevation (m)',
-                        colorbar_label=f'{tex_classes_use[i]} Prob.', hide_xticks=True, clim=(0,1))
-        cb_list.append(cb)
-        #plot_doi(axd[f'p{i+2}'], fj_sub.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_STANDARD', 'ELEVATION', fmt='k--')
-        plot_line_by_depth(axd[f'p{i+2}'], df.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_CONSERVATIVE', 'ELEVATION', fmt='k:')
-        plot_wl(axd[f'p{i+2}'], botdf, 'LINE_DIST', 'BOT_EST_POINT', None, fmt='r:', width_col='LINE_WIDTH', center=True)
-        plot_wl(axd[f'p{i+2}'], botdf, 'LINE_DIST', 'BOT_EST_LNE', None, fmt='r--', width_col='LINE_WIDTH', center=True)
-        # plot_wl(axd[f'p{i+2}'], fj_sub, 'LINE_DIST', 'bot_cf', None, fmt='m--', width_col='LINE_WIDTH', center=True)
-        # plot_wl(axd[f'p{i+2}'], fj_sub, 'LINE_DIST', 'bot1', None, fmt='g--', width_col='LINE_WIDTH', center=True)
-        plot_wl(axd[f'p{i+2}'], df, 'LINE_DIST', 'bot2', None, fmt='g--', width_col='LINE_WIDTH', center=True)
-
-    #-- Show line on map
-    aem_line_shp[aem_line_shp['SUBLINE_NO']==lne].plot(color='black', ax=axd['map'])
+    #-- Get Rectangles (vertex array, shared by all panels)
+    rect = df2polyverts(df, x_col='LINE_DIST', y_col='BOT_ELEV', xthk_col='LINE_WIDTH', ythk_col='THK')
+
+    #-- Overlays (DOI, bottom estimates, MF bottom)
+    doidf = df.dropna(subset='RHO_I')
+    line_overlays = {'doi': (doidf['LINE_DIST'], doidf['ELEVATION'] - doidf['DOI_CONSERVATIVE']),
+                     'bot_point': (botdf['LINE_DIST'] + botdf['LINE_WIDTH']/2, botdf['BOT_EST_POINT']),
+                     'bot_line': (botdf['LINE_DIST'] + botdf['LINE_WIDTH']/2, botdf['BOT_EST_LNE']),
+                     'bot2': (df['LINE_DIST'] + df['LINE_WIDTH']/2, df['bot2'])}
+
+    #-- Line & point to show on map
     spoint = aem_shp.loc[(aem_shp.SUBLINE_NO==lne) & (aem_shp.FID==df.loc[df.index[0],'FID'])]
-    mappoint = axd['map'].plot(spoint.geometry.x, spoint.geometry.y, 'o', color='black')[0]
 
-    #-- Save
     if use_mf_top_bot:
-        fig.savefig(plot_dir / f'AEMLines_Bottom_winsize{window_size}_minpoints{min_points}_{len(tex_classes)}cat_{lne}_MF_TOPBOT.png', dpi=300)
+        fname = plot_dir / f'AEMLines_Bottom_winsize{window_size}_minpoints{min_points}_{len(tex_classes)}cat_{lne}_MF_TOPBOT.png'
     else:
-        fig.savefig(plot_dir / f'AEMLines_Bottom_winsize{window_size}_minpoints{min_points}_{len(tex_classes)}cat_{lne}_MFlay_newbot.png', dpi=300)
+        fname = plot_dir / f'AEMLines_Bottom_winsize{window_size}_minpoints{min_points}_{len(tex_classes)}cat_{lne}_MFlay_newbot.png'
 
-    #-- Clear out
-    for cb in cb_list:
-        cb.remove()
-        aem_line_shp.plot(color='darkgray', ax=axd['map'])
-    mappoint.remove()
+    jobs.append({'filename': fname, 'rect': rect,
+                 'values': [df.RHO_I.to_numpy()] + [df[tex].to_numpy() for tex in tex_classes],
+                 'xlim': (line_min, line_max), 'ylim': ylim, 'title': f'Flight Line: {lne}',
+                 'overlays': {k: (np.asarray(x), np.asarray(y)) for k, (x, y) in line_overlays.items()},
+                 'line': lne, 'point_xy': (spoint.geometry.x.to_numpy(), spoint.geometry.y.to_numpy())})
+
+#-- Render (headless, one figure per worker process)
+print(f'Rendering {len(jobs)} line figures...')
+rendered = render_sections(jobs, panels, aem_line_shp, line_col='SUBLINE_NO', domain=svihm_domain,
+                           overlays=overlays, dpi=300, processes=n_plot_procs, raster=plot_raster,
+                           manifest=plot_dir / 'render_manifest.json' if skip_unchanged_plots else None)
+print(f'  {len(rendered)} rendered, {len(jobs) - len(rendered)} unchanged')
 
 print('Done.')
 
 # -------------------------------------------------------------------------------------------------------------------- #
-# Save bottoms as shapefile
+# Save bottoms
 
 # Create a GeoDataFrame
 bottoms_gdf = gpd.GeoDataFrame(
@@ -364,10 +348,8 @@ bottoms_gdf = gpd.GeoDataFrame(
 
 bottoms_gdf['BOT_DEPTH'] = bottoms_gdf['ELEVATION'] - bottoms_gdf['BOT_EST_LNE']
 
-# Export the GeoDataFrame to a shapefile
-output_shapefile = out_dir / 'aem_bottoms.shp'
-bottoms_gdf.to_file(output_shapefile, driver='ESRI Shapefile')
-
-print(f'Shapefile saved to {output_shapefile}')
+# Export the GeoDataFrame
+for fname in write_spatial(bottoms_gdf, out_dir / 'aem_bottoms', export_formats):
+    print(f'Saved {fname}')
 
 # -------------------------------------------------------------------------------------------------------------------- #
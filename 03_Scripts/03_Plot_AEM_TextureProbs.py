@@ -1,5 +1,5 @@
 import matplotlib
-matplotlib.use("TkAgg")
+matplotlib.use("Agg")
 
 import numpy as np
 import pandas as pd
@@ -16,8 +16,9 @@ os.chdir("03_Scripts/")
 
 import sys
 sys.path.append('./')
-from aem_plot.utils import df2rectangles, plot_slice_rect, plot_slice_rect_doi, plot_line_by_depth, plot_wl
-from aem_read import read_xyz, aem_wide2long, calc_line_geometry
+from aem_plot.utils import df2polyverts
+from aem_plot.batch import render_sections
+from aem_read import read_xyz, aem_wide2long, calc_line_geometry, read_texture_probs, align_texture_probs
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
@@ -45,6 +46,16 @@ sv_model_domain_file = shp_dir / 'Model_Domain_20180222.shp'
 
 use_mf_top_bot = True
 
+# Worker processes for rendering line figures (None = all cores)
+n_plot_procs = None
+
+# Only re-render lines whose plotted data or styling changed since the last run (see render_manifest.json)
+skip_unchanged_plots = True
+
+# Draw sections as resampled images instead of one polygon per pixel (faster, smaller files),
+# e.g. {'method': 'nearest'} or {'method': 'bilinear', 'dz': 1.0}. None = polygons
+plot_raster = None
+
 # Models
 base_dir = mod_dir / 'SVIHM_MF' / 'MODFLOW'
 
@@ -66,8 +77,8 @@ def nearest_cell(x, mf):
 # Read in data
 print('Reading Data...')
 aem_wide = read_xyz(aem_sharp_file, 26, x_col='UTMX', y_col='UTMY', delim_whitespace=True)
-tprobs = pd.read_csv(aem_tprobs_file, sep='\\s+')
-tex_classes = tprobs.columns[7:].tolist()
+tprobs = read_texture_probs(aem_tprobs_file)
+tex_classes = tprobs.columns[8:].tolist()
 #litho = pd.read_csv(aem_litho_file)
 
 # Read in shapefiles
@@ -89,11 +100,6 @@ aem_wide = aem_wide[aem_wide['LINE_NO'].isin(aem_shp['LINE_NO'])]
 
 print('Pre-plot calculations...')
 
-#-- Split line no & fid in rholog
-tprobs[['LINE_NO','FID']] = tprobs['Line'].str.split('_', expand=True)
-tprobs['LINE_NO'] = tprobs['LINE_NO'].map(int)
-tprobs['FID'] = tprobs['FID'].map(int)
-
 print('Loading MODFLOW Model...')
 mf_org = flopy.modflow.Modflow.load(base_dir / 'SVIHM.nam', load_only=['dis'], version='mfnwt')
 mf_org.modelgrid.set_coord_info(xoff=499977, yoff=4571330)
@@ -118,10 +124,8 @@ aem_long = aem_wide2long(aem_wide,
                          line_col='LINE_NO')
 
 #-- Merge in data from rholog
-aem_long = aem_long.merge(tprobs[['LINE_NO','FID','Depth'] + tex_classes],
-                          how='left',
-                          left_on=['LINE_NO','FID','DEP_BOT'],
-                          right_on=['LINE_NO','FID','Depth'])
+aem_long = aem_long.reset_index(drop=True)
+aem_long[tex_classes] = align_texture_probs(aem_long, tprobs, tex_classes)
 
 #-- Add a bottom elevation column
 aem_long['BOT_ELEV'] = aem_long['ELEVATION'] - aem_long['DEP_BOT']
@@ -129,29 +133,25 @@ aem_long['BOT_ELEV'] = aem_long['ELEVATION'] - aem_long['DEP_BOT']
 #-- There's no bottom for point 30 at each point (lowest pixel), so drop those values
 aem_long = aem_long.dropna(subset='BOT_ELEV')
 
-#-- Get Rectangles
-aem_long['AEMRect'] = df2rectangles(aem_long, x_col='LINE_DIST', y_col='BOT_ELEV',
-                               xthk_col='LINE_WIDTH', ythk_col='THK')
 aem_long['doi_elev'] = aem_long['ELEVATION'] - aem_long['DOI_CONSERVATIVE']
 
 print('Starting Plotting...')
 #plt.style.use('seaborn-v0_8-dark')
-fig, axd = plt.subplot_mosaic([['p1', 'map'], ['p2', 'map'], ['p3', 'map'], ['p4', 'map'], ['p5', 'map'], ['p6', 'map']],
-                              gridspec_kw={'width_ratios': [6, 2]},
-                              constrained_layout=True, figsize=(14, 10))
-
-#-- Setup map
-lmap = svihm_domain.plot(color='lightgray', ax=axd['map'])
-lmap = aem_line_shp.plot(color='darkgray', ax=axd['map'])
-lmap.set_axis_off()
 #prob_cmaps = ['Blues','Greens','Oranges','Purples','Reds']
 prob_cmaps = [LinearSegmentedColormap.from_list(f'cmap_{c}', [(1,1,1), to_rgb(c)]) for c in cc]
 
 # lne = 100701
 # fj_sub = aem_long[aem_long.SUBLINE_NO == lne]
 
-#-- Loop over lines plotting
-for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Plotting Line: '):
+#-- Figure layout (each render worker builds it once, then updates it in place for every line)
+panels = [{'cmap': 'turbo', 'clim': (1, 1000), 'colorbar_label': 'Resistivity (ohm-m)'}]
+panels += [{'cmap': prob_cmaps[i], 'clim': (0, 1), 'colorbar_label': f'{tex} Prob.'}
+           for i, tex in enumerate(tex_classes)]
+overlays = [('doi', 'k:', 0.9)]  #, ('bot1', 'k--', 0.9), ('bot2', 'k--', 0.9)]
+
+#-- Loop over lines collecting plot data, figures are rendered in parallel below
+jobs = []
+for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Preparing Line: '):
 
     #ylim = (fj_sub.BOT_ELEV.min(), fj_sub.ELEVATION.max())
     if use_mf_top_bot:
@@ -163,60 +163,33 @@ for lne, df in tqdm(aem_long.groupby('SUBLINE_NO'), desc='Plotting Line: '):
     line_max += 0.05 * np.sign(line_max)
     line_min -= 0.05 * np.sign(line_min)
 
-    ln_list = []
-    cb_list = []
-
-    #-- Rho
-    ln1, cb = plot_slice_rect_doi(fig, axd['p1'], rect=df.AEMRect, values=df.RHO_I, doi_values=df.doi_elev,
-                                  cmap='turbo',
-                                  title=f'Flight Line: {lne}',
-                                  xlim=(line_min, line_max),
-                                  ylim=ylim,
-                                  clim=(1,1000),
-                                  ylabel='Elevation (m)',
-                                  colorbar_label='Resistivity (ohm-m)',
-                                  doi_alpha=1.0,
-                                  hide_xticks=True)
-    cb_list.append(cb)
-    #plot_doi(axd['p1'], fj_sub.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_STANDARD', 'ELEVATION', fmt='k--')
-    plot_line_by_depth(axd['p1'], df.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_CONSERVATIVE', 'ELEVATION', fmt='k:')
-    # plot_wl(axd['p1'], fj_sub.dropna(subset='RHO_I'), 'LINE_DIST', 'aemwlidw', 'ELEVATION', fmt='r--')
-    #plot_wl(axd['p1'], fj_sub, 'LINE_DIST', 'bot1', None, fmt='k--', width_col='LINE_WIDTH', center=True)
-    #plot_wl(axd['p1'], fj_sub, 'LINE_DIST', 'bot2', None, fmt='k--', width_col='LINE_WIDTH', center=True)
-
-    #-- Loop over Textures
-    for i, tex in enumerate(tex_classes):
-        # ln, cb = plot_slice_rect(fig, axd[f'p{i+2}'], rect=fj_sub.AEMRect, values=fj_sub[tex], cmap=prob_cmaps[i],
-        #                 xlim=(line_min, line_max),
-        #                 ylim=ylim,
-        #                 ylabel='Elevation (m)',
-        #                 colorbar_label=f'{tex} Prob.', hide_xticks=True, clim=(0,1))
-        ln, cb = plot_slice_rect_doi(fig, axd[f'p{i+2}'], rect=df.AEMRect, values=df[tex], cmap=prob_cmaps[i], doi_values=df.doi_elev,
-                        xlim=(line_min, line_max),
-                        ylim=ylim,
-                        ylabel='Elevation (m)',
-                        doi_alpha=1.0,
-                        colorbar_label=f'{tex} Prob.', hide_xticks=True, clim=(0,1))
-        cb_list.append(cb)
-        #plot_line_by_depth(axd[f'p{i+2}'], fj_sub.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_STANDARD', 'ELEVATION', fmt='k--')
-        plot_line_by_depth(axd[f'p{i+2}'], df.dropna(subset='RHO_I'), 'LINE_DIST', 'DOI_CONSERVATIVE', 'ELEVATION', fmt='k:')
-        #plot_wl(axd[f'p{i+2}'], fj_sub, 'LINE_DIST', 'bot1', None, fmt='k--', width_col='LINE_WIDTH', center=True)
-        #plot_wl(axd[f'p{i+2}'], fj_sub, 'LINE_DIST', 'bot2', None, fmt='k--', width_col='LINE_WIDTH', center=True)
-
-    #-- Show line on map
-    aem_line_shp[aem_line_shp['SUBLINE_NO']==lne].plot(color='black', ax=axd['map'])
+    #-- Get Rectangles (vertex array, shared by all panels)
+    rect = df2polyverts(df, x_col='LINE_DIST', y_col='BOT_ELEV', xthk_col='LINE_WIDTH', ythk_col='THK')
+
+    #-- DOI overlay
+    doidf = df.dropna(subset='RHO_I')
+    doi_xy = (doidf['LINE_DIST'].to_numpy(), (doidf['ELEVATION'] - doidf['DOI_CONSERVATIVE']).to_numpy())
+
+    #-- Line & point to show on map
     spoint = aem_shp.loc[(aem_shp.SUBLINE_NO==lne) & (aem_shp.FID==df.loc[df.index[0],'FID'])]
-    mappoint = axd['map'].plot(spoint.geometry.x, spoint.geometry.y, 'o', color='black')[0]
 
-    #-- Save
     if use_mf_top_bot:
-        fig.savefig(plot_dir / f'AEMLines_TextureProbs_MFTOPBOT_{len(tex_classes)}cat_{lne}.png', dpi=300)  # bbox_inches='tight')
+        fname = plot_dir / f'AEMLines_TextureProbs_MFTOPBOT_{len(tex_classes)}cat_{lne}.png'
     else:
-        fig.savefig(plot_dir / f'AEMLines_TextureProbs_{len(tex_classes)}cat_{lne}.png', dpi=300)  # bbox_inches='tight')
-    #-- Clear out
-    for cb in cb_list:
-        cb.remove()
-        aem_line_shp.plot(color='darkgray', ax=axd['map'])
-    mappoint.remove()
+        fname = plot_dir / f'AEMLines_TextureProbs_{len(tex_classes)}cat_{lne}.png'
+
+    jobs.append({'filename': fname, 'rect': rect,
+                 'values': [df.RHO_I.to_numpy()] + [df[tex].to_numpy() for tex in tex_classes],
+                 'doi_values': df.doi_elev.to_numpy(),
+                 'xlim': (line_min, line_max), 'ylim': ylim, 'title': f'Flight Line: {lne}',
+                 'overlays': {'doi': doi_xy},
+                 'line': lne, 'point_xy': (spoint.geometry.x.to_numpy(), spoint.geometry.y.to_numpy())})
+
+#-- Render (headless, one figure per worker process)
+print(f'Rendering {len(jobs)} line figures...')
+rendered = render_sections(jobs, panels, aem_line_shp, line_col='SUBLINE_NO', domain=svihm_domain, doi_alpha=1.0,
+                           overlays=overlays, dpi=300, processes=n_plot_procs, raster=plot_raster,
+                           manifest=plot_dir / 'render_manifest.json' if skip_unchanged_plots else None)
+print(f'  {len(rendered)} rendered, {len(jobs) - len(rendered)} unchanged')
 
 print('Done.')
@@ -3,9 +3,15 @@ matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import pandas as pd
 import geopandas as gpd
-import t2py
 from pathlib import Path
 
+# Local
+import sys
+sys.path.append('./03_Scripts/')
+from texture_map import map_textures, report_unknown_textures
+from domain_mask import DomainMask, WITHIN_BUFFER, zone_names
+from T2P_funcs import update_log_file
+
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -33,31 +39,6 @@ tailings_issue_logs = [18416, 18424, 18223, 18528, 18339]
 # Classes/Functions
 # -------------------------------------------------------------------------------------------------------------------- #
 
-def reclassify_texture(intv):
-    tex = intv['Texture']
-    # Cluster 0
-    if tex in ['shale','claystone']:
-        tex = 'Fine'
-    # Cluster 1
-    elif tex in ['clay','silt','loam','top soil']:
-        tex = 'Mixed_Fine'
-    # Cluster 2
-    elif tex in ['sand']:
-        tex = 'Sand'
-    # Cluster 3
-    elif tex in ['gravel','cobbles']:
-        tex = 'Mixed_Coarse'
-    # Cluster 4
-    elif tex in ['boulders','sandstone','lava','lime','rock']:
-        tex = 'Very_Coarse'
-    # elif tex == 'unknown':
-    #     tex = -999
-    else:
-        print('UNKNOWN TEXTURE:', intv[['Texture','Primary_Texture_Modifier']])
-    return tex
-
-# -------------------------------------------------------------------------------------------------------------------- #
-
 def plot_points_with_buffer(domain, buffer, points, location_col, title, output_file=None):
     """
     Plots points relative to a domain and buffer zone.
@@ -122,19 +103,19 @@ svihm_domain = gpd.read_file(sv_model_domain_file)
 litho_shp = pd.concat([aem_lqwells_shp, aem_hqwells_shp])
 
 # Create buffer
-buffer_shp = svihm_domain.buffer(svihm_buffer)
+domain_mask = DomainMask(svihm_domain, svihm_buffer)
+buffer_shp = domain_mask.buffer_shp
 
 # Classify points: Inside domain, within buffer, or outside buffer
-litho_shp['location'] = 'Outside Buffer'  # Default
-litho_shp.loc[litho_shp.within(buffer_shp.union_all()), 'location'] = 'Within Buffer'
-litho_shp.loc[litho_shp.within(svihm_domain.union_all()), 'location'] = 'Inside Domain'
+litho_shp['zone'] = domain_mask.classify_points(litho_shp)
+litho_shp['location'] = zone_names(litho_shp['zone'])
 
 # Plot!
 plot_points_with_buffer(svihm_domain, buffer_shp, litho_shp,
                         'location', f'Points in SVIHM Domain & {svihm_buffer}m Buffer')
 
 # Limit to SV buffer (points inside the domain or buffer)
-litho_shp = litho_shp[litho_shp.within(buffer_shp.union_all())]
+litho_shp = litho_shp[litho_shp['zone'] <= WITHIN_BUFFER]
 
 # Limit Texture data to Scott Valley buffer
 litho = litho[litho.WELL_INFO_ID.isin(litho_shp.index)]
@@ -147,14 +128,15 @@ litho_shp['WELL_INFO_ID'] = litho_shp.index
 # ...Copy to litho
 litho = litho.merge(litho_shp[['WELL_INFO_ID','X','Y']], how='inner', on='WELL_INFO_ID')
 
-# Apply texture revisions
-litho['tex_rev'] = litho.apply(reclassify_texture, axis=1)
+# Apply texture revisions (texture_map.TEXTURE_TABLE), textures not in the table are left as-is
+report_unknown_textures(litho['Texture'])
+litho['tex_rev'] = map_textures(litho['Texture'], 'ModelClass', default=litho['Texture'])
 
 # Calculate the interval thickness
 litho['thick'] = litho['LITH_BOT_DEPTH_m'] - litho['LITH_TOP_DEPTH_m']
 
-# Group by reclassified texture and sum the interval thicknesses
-thickness_by_texture = litho.groupby('tex_rev')['thick'].sum()
+# Group by reclassified texture and sum the interval thicknesses (no-data intervals shown as 'unknown')
+thickness_by_texture = litho.groupby(litho['tex_rev'].fillna('unknown'))['thick'].sum()
 
 # Create histogram
 plt.figure(figsize=(10, 6))
@@ -174,16 +156,18 @@ litho.loc[litho.WELL_INFO_ID.isin(tailings_issue_logs), 'tex_rev'] = 'Very_Coars
 
 # Setup for t2py
 #litho['Name'] = litho.agg(lambda x: f"{x['WELL_INFO_ID']:g}_{x['LITH_ID']:g}", axis=1)
-for tex in ['Fine','Mixed_Fine','Sand','Mixed_Coarse','Very_Coarse']:
+tex_classes = ['Fine','Mixed_Fine','Sand','Mixed_Coarse','Very_Coarse']
+for tex in tex_classes:
     litho[tex] = 0.0
     litho.loc[litho['tex_rev'] == tex, tex] = 1.0
     # litho.loc[litho['tex_rev'] == -999, tex] = None
-    litho.loc[litho['tex_rev'] == 'unknown', tex] = None
+    litho.loc[litho['tex_rev'].isna(), tex] = None
 
 # Create a well log file and write it out
-log = t2py.Dataset(classes=['Fine','Mixed_Fine','Sand','Mixed_Coarse','Very_Coarse'])
-log.add_wells_by_df(df=litho,
-                    name_col='WELL_INFO_ID',
-                    zland_col='GROUND_SURFACE_ELEVATION_m',
-                    depth_col='LITH_BOT_DEPTH_m', depth_top_col='LITH_TOP_DEPTH_m')
-log.write_file(out_dir / 'LithoLog_5classes.dat')
\ No newline at end of file
+# Only logs whose intervals changed since the last run are rewritten (see the .manifest.json next to the file)
+n_written, n_copied = update_log_file(litho, out_dir / 'LithoLog_5classes.dat',
+                                      name_col='WELL_INFO_ID',
+                                      zland_col='GROUND_SURFACE_ELEVATION_m',
+                                      depth_col='LITH_BOT_DEPTH_m', depth_top_col='LITH_TOP_DEPTH_m',
+                                      data_class_cols={c: c for c in tex_classes})
+print(f'LithoLog_5classes.dat: {n_written} logs rewritten, {n_copied} unchanged')
@@ -2,16 +2,18 @@ import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 from pykrige.ok import OrdinaryKriging
-import t2py
 
 # Local
 import sys
 sys.path.append('./03_Scripts/')
-from aem_read import read_xyz, aem_wide2long
+from aem_read import read_xyz, aem_wide2long, flag_saturated
+from T2P_funcs import write_log_file
+from domain_mask import DomainMask, WITHIN_BUFFER
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
@@ -46,14 +48,14 @@ def plot_intervals_below_water_table(aem_shp, aem_long, domain, buffer, title, o
 
     Parameters:
         aem_shp (GeoDataFrame): GeoDataFrame of AEM points with spatial information.
-        aem_long (DataFrame): DataFrame of AEM depth intervals, including DEP_TOP and ok_dtw.
+        aem_long (DataFrame): DataFrame of AEM depth intervals, including DEP_TOP and SAT (see flag_saturated).
         domain (GeoDataFrame): GeoDataFrame of the SVIHM domain polygon.
         buffer (GeoSeries): GeoSeries of the SVIHM buffer polygon.
         title (str): Title of the plot.
         output_file (str, optional): Filepath to save the plot as an image. Defaults to None.
     """
     # Count intervals below the water table for each point
-    below_water_counts = aem_long.loc[aem_long['DEP_TOP'] >= aem_long['ok_dtw']].groupby('FID').size()
+    below_water_counts = aem_long.loc[aem_long['SAT']].groupby('FID').size()
 
     # Merge counts with aem_shp
     aem_shp['below_water_count'] = aem_shp['FID'].map(below_water_counts).fillna(0).astype(int)
@@ -97,7 +99,7 @@ def plot_minimum_depth_below_water_table(aem_shp, aem_long, domain, buffer, titl
 
     Parameters:
         aem_shp (GeoDataFrame): GeoDataFrame of AEM points with spatial information.
-        aem_long (DataFrame): DataFrame of AEM depth intervals, including DEP_TOP and ok_dtw.
+        aem_long (DataFrame): DataFrame of AEM depth intervals, including DEP_TOP and SAT (see flag_saturated).
         domain (GeoDataFrame): GeoDataFrame of the SVIHM domain polygon.
         buffer (GeoSeries): GeoSeries of the SVIHM buffer polygon.
         title (str): Title of the plot.
@@ -105,7 +107,7 @@ def plot_minimum_depth_below_water_table(aem_shp, aem_long, domain, buffer, titl
     """
     # Calculate the minimum DEP_TOP below the water table for each point
     min_depths = (
-        aem_long.loc[aem_long['DEP_TOP'] >= aem_long['ok_dtw']]
+        aem_long.loc[aem_long['SAT']]
         .groupby('FID')['DEP_TOP']
         .min()
     )
@@ -159,10 +161,11 @@ aem_shp['Y'] = aem_shp.geometry.y
 svihm_domain = gpd.read_file(sv_model_domain_file)
 
 # Create buffer
-buffer_shp = svihm_domain.buffer(svihm_buffer)
+domain_mask = DomainMask(svihm_domain, svihm_buffer)
+buffer_shp = domain_mask.buffer_shp
 
 # Limit to SV buffer (points inside the domain or buffer)
-aem_shp = aem_shp[aem_shp.within(buffer_shp.union_all())]
+aem_shp = aem_shp[domain_mask.classify(aem_shp['X'], aem_shp['Y']) <= WITHIN_BUFFER]
 
 # Get Water Levels at log locs
 ok = OrdinaryKriging(obs_wls['UTM_x'], obs_wls['UTM_y'], obs_wls['DTW_m'],
@@ -190,6 +193,9 @@ aem_long = aem_long.dropna(subset='DEP_BOT')
 # Drop any NA Rho values
 aem_long = aem_long.loc[~aem_long['RHO_I'].isna()]
 
+# Saturated pixels: top at or below the kriged depth to water (computed once, used by the plots & filter)
+aem_long = flag_saturated(aem_long, 'ok_dtw', criterion='top')
+
 plot_intervals_below_water_table(
     aem_shp=aem_shp,
     aem_long=aem_long,
@@ -205,19 +211,22 @@ plot_minimum_depth_below_water_table(
     title='Minimum Depth Below Water Table at AEM Points')
 
 # Filter out unsaturated points (above water table)
-aem_long = aem_long.loc[(aem_long['DEP_TOP'] >= aem_long['ok_dtw'])]
-
-# Setup T2PY output & write
-aem_long['line_id'] = aem_long.agg(lambda x: f"{x['LINE_NO']:g}_{x['FID']:g}", axis=1)
-wells = t2py.Dataset(classes=['Rho'])
-wells.add_wells_by_df(df = aem_long,
-                      name_col='line_id',
-                      zland_col='ELEVATION',
-                      depth_col='DEP_BOT',
-                      depth_top_col='DEP_TOP',
-                      data_class_cols={'Rho': 'RHO_I'})
+aem_long = aem_long.loc[aem_long['SAT']]
+
+# Log names (LINE_FID), formatted once per sounding rather than once per pixel
+soundings = aem_long[['LINE_NO', 'FID']].drop_duplicates()
+soundings['line_id'] = np.char.add(np.char.add(np.char.mod('%g', soundings['LINE_NO'].to_numpy()), '_'),
+                                   np.char.mod('%g', soundings['FID'].to_numpy()))
+aem_long = aem_long.merge(soundings, on=['LINE_NO', 'FID'], how='left')
 
+# Write T2P log file (same output as t2py.Dataset add_wells_by_df/write_file, written in bulk)
 print('Writing File...')
 out_dir.mkdir(parents=True, exist_ok=True)
-wells.write_file(out_dir / 'AEMLog_noUnsat.dat', header=['Line', 'ID', 'n', 'X', 'Y', 'Zland', 'Depth', 'Rho'])
+write_log_file(aem_long, out_dir / 'AEMLog_noUnsat.dat',
+               name_col='line_id',
+               zland_col='ELEVATION',
+               depth_col='DEP_BOT',
+               depth_top_col='DEP_TOP',
+               data_class_cols={'Rho': 'RHO_I'},
+               header=['Line', 'ID', 'n', 'X', 'Y', 'Zland', 'Depth', 'Rho'])
 print('Done.')
\ No newline at end of file
@@ -6,11 +6,14 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime
 import copy
-import shutil
-import subprocess
-from concurrent.futures import ThreadPoolExecutor
 import t2py
 
+import sys
+sys.path.append('./03_Scripts/')
+from run_dirs import build_run_dir, link_tree, replace_file
+from run_scheduler import Job, JobScheduler, default_workers
+from T2P_funcs import read_texture_results
+
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -23,10 +26,32 @@ t2p_log = t2p_dir / 'logs_and_AEM_5classes.dat'
 t2p_path = Path('./00_Tools/T2P_Beta2/bin/Texture2Par.exe')
 run_dir = Path('./02_Models/CV_runs/')
 run_dir.mkdir(parents=True, exist_ok=True)
+input_dir = run_dir / 'inputs'
+
+# Run directories: shared inputs are linked, not copied (see run_dirs.LINK_MODES). Model files matching
+# cv_materialize are copied per nnear, as Texture2Par may rewrite them.
+link_mode = 'hardlink'
+cv_materialize = ['*.upw']
+
+# Texture2Par runs: at most t2p_max_workers at once (fewer if cores/memory are short), per-run timeout (s) and
+# retries. With resume_runs, runs that already finished with the same inputs (sentinel files) are not rerun.
+t2p_max_workers = 12
+t2p_mem_per_run = 2e9
+t2p_timeout = 4 * 3600
+t2p_retries = 1
+resume_runs = True
 
 classes = ['Fine', 'Mixed_Fine', 'Sand', 'Mixed_Coarse', 'Very_Coarse']
 FOLDS = 10
-N_LIST = [16] #, 24, 32, 48, 64, 96, 128, 200, 300]
+N_LIST = [16, 24, 32, 48, 64, 96, 128, 200, 300]
+
+# nnear search: 'grid' runs every fold for every nnear in N_LIST. 'halving' (successive halving, opt-in, fewer
+# runs) first runs halving_min_folds folds for every nnear, keeps the best 1/halving_eta by mean Brier score, and
+# reruns the survivors on halving_eta times as many folds, until the survivors have all FOLDS folds; finalists are
+# then chosen among the survivors only, so results can differ from 'grid'.
+search_mode = 'grid'
+halving_min_folds = 2
+halving_eta = 3
 
 np.random.seed(667)
 
@@ -43,60 +68,22 @@ def update_nnear(t2p_list, nnear_lines, new_nnear):
 
 # -------------------------------------------------------------------------------------------------------------------- #
 
-def run_t2p(dir, t2p_path, t2p_infile):
-    """Run the external program with given argument list."""
-    try:
-        result = subprocess.run(
-            [t2p_path, t2p_infile],
-            cwd=dir,
-            capture_output=True,
-            text=True,
-            check=True      # raise exception on failure
-        )
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        return f"ERROR: {e}\n{e.stdout}\n{e.stderr}"
-
-# -------------------------------------------------------------------------------------------------------------------- #
-
-def job(run_config):
-    run_dir, t2p_infile = run_config
-    print(f" - STARTED:  {run_dir.name}")
-    result = run_t2p(run_dir, t2p_path.absolute(), t2p_infile)
-    print(f" - FINISHED: {run_dir.name}")
-    return result
-
-# -------------------------------------------------------------------------------------------------------------------- #
-
-def get_texture_results(dir, classes):
-    texture_data = {tex: pd.read_csv(dir / f't2p_{tex.upper()}.csv', na_values=-999) for tex in classes}
-    combined = None
-    for tex_name, df in texture_data.items():
-        layers = sum(df.columns.str.startswith('Layer'))
-        df = df.rename(columns={df.columns[0]: 'Row', df.columns[1]: 'Col'})
-        for k in range(0,layers):
-            if k==0:  laycombined = df['Layer1']
-            else:
-                laycombined = pd.concat([laycombined, df[f'Layer{k}']])
-        if combined is None:
-            combined = pd.DataFrame({tex_name : laycombined.values})
-        else:
-            combined[tex_name] = laycombined.values
-
-    # Normalize & return
-    return combined.div(combined.sum(axis=1), axis=0)
+def get_texture_results(dir, classes, cache=True):
+    """ (ncell * nlay, nclass) texture fractions of a run, normalized to sum to 1 per cell (NaN where missing) """
+    values = read_texture_results(dir, [tex.upper() for tex in classes], cache=cache)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return values / np.nansum(values, axis=1, keepdims=True)
 
 # -------------------------------------------------------------------------------------------------------------------- #
 
-def calculate_cv_metrics(full_df, fold_df, classes):
-    # Combine prediction and truth
-    combined = pd.concat([full_df[classes], fold_df[classes]], axis=1, keys=['true', 'pred'])
-    combined = combined.dropna()
-    if combined.empty:
+def calculate_cv_metrics(full, fold):
+    # Cells with a prediction and truth for every class
+    valid = np.isfinite(full).all(axis=1) & np.isfinite(fold).all(axis=1)
+    if not valid.any():
         return None
 
-    true_vals = combined['true'].values
-    pred_vals = combined['pred'].values
+    true_vals = full[valid]
+    pred_vals = fold[valid]
 
     brier_score = ((true_vals - pred_vals) ** 2).sum(axis=1).mean()
     mae_score = np.abs(true_vals - pred_vals).mean(axis=1).mean()
@@ -116,6 +103,11 @@ def calculate_cv_metrics(full_df, fold_df, classes):
         'n_samples': len(pred_vals)
     }
 
+def select_survivors(scores, eta):
+    """ nnear values (index of scores) with the lowest mean Brier scores, keeping ceil(len / eta), at least one """
+    keep = max(int(np.ceil(len(scores) / eta)), 1)
+    return sorted(scores.sort_values(kind='stable').index[:keep].tolist())
+
 # -------------------------------------------------------------------------------------------------------------------- #
 # Main
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -143,86 +135,94 @@ with open(t2p_inf, 'r') as f:
             nnear_lines.append(i+1)
 print(f'Found {len(nnear_lines)} variogram nnear specifications in {t2p_inf.name}')
 
-
-# Setup tests
-for n in N_LIST:
+# Log files of the full run and of each fold, written once and shared by every nnear
+run_logs = {'full_run': replace_file(input_dir / f'full_run_{t2p_log.name}',
+                                     lambda tmp: basecase.write_file(filename=tmp))}
+for f in range(0, FOLDS):
+    folddf = basecase.fj_sub.copy()
+    loc_ids = [idx for idx, tag in enumerate(fold_tag) if tag != f]
+    folddf = folddf[folddf.ID.isin(loc_ids)]
+    foldcase = t2py.Dataset(classes)
+    foldcase.add_wells_by_df(folddf, name_col='Location', fill_missing=False)
+    run_logs[f'fold_{f}'] = replace_file(input_dir / f'fold_{f}_{t2p_log.name}',
+                                         lambda tmp: foldcase.write_file(filename=tmp))
+print(f'Wrote {len(run_logs)} log files to {input_dir}')
+
+# Scheduler for the Texture2Par runs; a run counts as finished once every texture result file exists
+scheduler = JobScheduler(workers=default_workers(t2p_mem_per_run, max_workers=t2p_max_workers),
+                         timeout=t2p_timeout, retries=t2p_retries)
+t2p_outputs = [f't2p_{tex.upper()}.csv' for tex in classes]
+
+
+# Search over nnear in rungs. Each rung runs the full run and the first n_folds folds of every candidate as one batch
+# (runs finished in an earlier rung are skipped by their sentinels), then scores the folds not scored yet.
+candidates = list(N_LIST)
+n_folds = FOLDS if search_mode == 'grid' else min(halving_min_folds, FOLDS)
+scored = set()
+rung = 0
+while True:
     print('\n*----------------------------------------------------')
-    print(f'* Starting nnear = {n}')
+    print(f'* Rung {rung}: {n_folds} folds for nnear = {candidates}')
     print('*----------------------------------------------------\n')
 
-    # Setup T2P file
-    t2p_nnear = update_nnear(t2p_in, nnear_lines, n)
-
-    nruns = []
-
-    # Setup full run
-    full_dir = run_dir / f'{n}_nnear' / f'full_run'
-    full_dir.mkdir(parents=True, exist_ok=True)
+    # Full run + folds: only the T2P input is written per run, the log file is linked from the shared inputs.
+    # The model folder is linked once per nnear (runs reference it as a sibling folder)
+    run_names = ['full_run'] + [f'fold_{f}' for f in range(n_folds)]
+    jobs = []
+    for n in candidates:
+        t2p_nnear = ''.join(update_nnear(t2p_in, nnear_lines, n))
+        nnear_dir = run_dir / f'{n}_nnear'
+        link_tree(mod_dir, nnear_dir / mod_dir.name, link_mode, cv_materialize)
+        for name in run_names:
+            rdir = build_run_dir(nnear_dir / name, files={t2p_inf.name: t2p_nnear},
+                                 links={t2p_log.name: run_logs[name]}, mode=link_mode)
+            jobs.append(Job(f'nnear{n}_{name}', [t2p_path.absolute(), t2p_inf.name], cwd=rdir,
+                            inputs=[t2p_inf.name, t2p_log.name], outputs=t2p_outputs))
+    print(f'Set up {len(jobs)} runs for {len(candidates)} nnear values')
+
+    # Run all (finished runs are skipped, see resume_runs)
+    status = scheduler.run(jobs, resume=resume_runs).set_index('name')['status']
 
-    # Write files
-    with open(full_dir / t2p_inf.name, "w") as f:
-        for line in t2p_nnear:
-            f.write(line)
-    nruns.append((full_dir.absolute(), t2p_inf.name))
-    print(f'Wrote {full_dir / t2p_inf.name}')
-
-    basecase.write_file(filename=full_dir / t2p_log.name)
-    print(f'Wrote {full_dir / t2p_log.name}')
-
-    # Setup Folds
-    for f in range(0, FOLDS):
-
-        # Create a new folder
-        nnear_dir = run_dir / f'{n}_nnear' / f'fold_{f}'
-        nnear_dir.mkdir(parents=True, exist_ok=True)
-
-        # Setup dataset
-        folddf = basecase.fj_sub.copy()
-        loc_ids = [idx for idx, tag in enumerate(fold_tag) if tag != f]
-        folddf = folddf[folddf.ID.isin(loc_ids)]
-        foldcase = t2py.Dataset(classes)
-        foldcase.add_wells_by_df(folddf, name_col='Location', fill_missing=False)
-
-        # Write files
-        with open(nnear_dir / t2p_inf.name, "w") as f:
-            for line in t2p_nnear:
-                f.write(line)
-        nruns.append((nnear_dir.absolute(), t2p_inf.name))
-        print(f'Wrote {nnear_dir / t2p_inf.name}')
-
-        foldcase.write_file(filename=nnear_dir / t2p_log.name)
-        print(f'Wrote {nnear_dir / t2p_log.name}')
-
-    # Copy in model folder
-    try:
-        shutil.copytree(mod_dir, run_dir / f'{n}_nnear' / mod_dir.name)
-    except FileExistsError:
-        pass
-
-    # Run for all nnear folders
-    with ThreadPoolExecutor(max_workers=12) as pool:
-        results = list(pool.map(job, nruns))
-
-    # Read in full results
-    full = get_texture_results(full_dir, classes)
-
-    # Loop over folds getting results
     cv_results = []
-
-    for f in range(FOLDS):
-        fold_dir = run_dir / f'{n}_nnear' / f'fold_{f}'
-        fold_pred = get_texture_results(fold_dir, classes)
-
-        # Remove NAs and calculate metrics
-        result = calculate_cv_metrics(full, fold_pred, classes)
-
-        if result is not None:
-            result.update({'nnear': n, 'fold': f})
-            cv_results.append(result)
-        else:
-            print(f"Fold {f}: No valid data after dropping NAs.")
-    cv_log_df = pd.DataFrame(cv_results)
-    all_logs = pd.concat([all_logs, cv_log_df], ignore_index=True)
+    for n in candidates:
+        nnear_dir = run_dir / f'{n}_nnear'
+        if status[f'nnear{n}_full_run'] not in ('done', 'skipped'):
+            print(f'nnear = {n}: full run {status[f"nnear{n}_full_run"]}, see {nnear_dir / "full_run"} logs.')
+            continue
+
+        # Read in full results
+        full = get_texture_results(nnear_dir / 'full_run', classes)
+
+        # Loop over new folds getting results
+        for f in range(n_folds):
+            fold_dir = nnear_dir / f'fold_{f}'
+            if (n, f) in scored:
+                continue
+            if status[f'nnear{n}_fold_{f}'] not in ('done', 'skipped'):
+                print(f"nnear = {n}, fold {f}: run {status[f'nnear{n}_fold_{f}']}, see {fold_dir} logs.")
+                continue
+            scored.add((n, f))
+            fold_pred = get_texture_results(fold_dir, classes)
+
+            # Remove NAs and calculate metrics
+            result = calculate_cv_metrics(full, fold_pred)
+
+            if result is not None:
+                result.update({'nnear': n, 'fold': f, 'rung': rung})
+                cv_results.append(result)
+            else:
+                print(f"nnear = {n}, fold {f}: No valid data after dropping NAs.")
+    all_logs = pd.concat([all_logs, pd.DataFrame(cv_results)], ignore_index=True)
+
+    # Prune: candidates ranked by mean Brier score over this rung's folds
+    if n_folds >= FOLDS or all_logs.empty:
+        break
+    rung_logs = all_logs[all_logs['nnear'].isin(candidates) & (all_logs['fold'] < n_folds)]
+    scores = rung_logs.groupby('nnear')['brier_score'].mean()
+    print('Mean Brier score by nnear:\n' + scores.to_string(float_format='%.4f'))
+    candidates = select_survivors(scores, halving_eta)
+    n_folds = min(n_folds * halving_eta, FOLDS)
+    rung += 1
 
 # Write Out Log
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -241,13 +241,15 @@ grouped = all_logs.groupby('nnear').agg({
     'mae_score': 'mean',
     'misclass_rate': 'mean',
     'out_of_bounds_prop': 'mean',
-    'n_samples': 'sum'
-}).reset_index()
-
-# Find the best nnear values for each metric
-best_brier = grouped.loc[grouped['brier_score'].idxmin()]
-best_mae = grouped.loc[grouped['mae_score'].idxmin()]
-best_misclass = grouped.loc[grouped['misclass_rate'].idxmin()]
+    'n_samples': 'sum',
+    'fold': 'count'
+}).rename(columns={'fold': 'n_folds'}).reset_index()
+
+# Find the best nnear values for each metric, among the nnear values that got the most folds (halving survivors)
+finalists = grouped if search_mode == 'grid' else grouped[grouped['n_folds'] == grouped['n_folds'].max()]
+best_brier = finalists.loc[finalists['brier_score'].idxmin()]
+best_mae = finalists.loc[finalists['mae_score'].idxmin()]
+best_misclass = finalists.loc[finalists['misclass_rate'].idxmin()]
 
 print("*----------------- Summary -----------------*")
 print(grouped.to_string(index=False, float_format="%.4f"))
@@ -14,6 +14,7 @@ from hydroeval import evaluator, nse, kge, rmse, pbias
 
 import sys
 sys.path.append('./03_Scripts')
+from spatial_io import read_spatial
 from HOB_weight_processing import hob_to_df, wt_dict, calculate_hob_weights
 
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -205,8 +206,8 @@ well_metrics = pd.merge(well_metrics,
 # Convert to GDF
 well_gdf = gpd.GeoDataFrame(well_metrics, geometry=gpd.points_from_xy(well_metrics.x_proj, well_metrics.y_proj))
 
-# Read MODFLOW grid shapefile
-grid = gpd.read_file(sv_model_shp_file)
+# Read MODFLOW grid (converted once to GeoParquet next to the shapefile, re-used until the shapefile changes)
+grid = read_spatial(sv_model_shp_file, cache=True)
 #grid['geometry'] = grid['geometry'].apply(convert_to_2d)
 
 # Create UPW properties DataFrame
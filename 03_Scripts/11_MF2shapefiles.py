@@ -10,6 +10,11 @@ import geopandas as gpd
 from tqdm import tqdm
 from pathlib import Path
 
+import sys
+sys.path.append('./03_Scripts/')
+from mf_grid import GridFrames
+from spatial_io import write_spatial
+
 # -------------------------------------------------------------------------------------------------------------------- #
 # Settings
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -33,6 +38,10 @@ sfr_file = mod_dir / 'svihm.sfr'
 # Outputs
 pst_run_name = 'calib_12_itermix'
 sfr_shapefile   = shp_dir / f"sfr_properties_{pst_run_name}.shp"
+grid_gpkg       = shp_dir / f"mf_grid_{pst_run_name}.gpkg"   # all grid layers
+
+# Spatial output formats: 'parquet' (GeoParquet), 'gpkg' (GeoPackage), 'shp' (ESRI Shapefile)
+export_formats = ['parquet', 'gpkg']
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -52,6 +61,9 @@ mf = fp.modflow.Modflow.load(nam_file,
                              check=False)
 mf.modelgrid.set_coord_info(xoff=xoff, yoff=yoff)
 
+# Cell polygons are built once and shared by all layers
+grid_frames = GridFrames(mf.modelgrid, crs='EPSG:26910')
+
 # Loop over layers
 for k in tqdm(range(0, mf.nlay), desc='Processing Layer'):
     array_dict = {
@@ -66,25 +78,12 @@ for k in tqdm(range(0, mf.nlay), desc='Processing Layer'):
         'aniso': mf.upw.hk.array[k] / mf.upw.vka.array[k],
     }
 
-    # Write out a temporary shapefile
-    temp_name = 'grid_temp.shp'
-    fp.export.shapefile_utils.write_grid_shapefile(
-        path=shp_dir / temp_name,
-        mg=mf.modelgrid,
-        array_dict=array_dict,
-        nan_val=np.nan,
-        crs="EPSG:26910"
-    )
-
+    # Keep only IBOUND>0
     fname = f"mf_grid_{pst_run_name}_layer{k + 1}.shp"
-    gdf = gpd.read_file(shp_dir / temp_name).set_crs(crs='EPSG:26910', allow_override=True)
-    gdf = gdf[gdf.IBOUND != 0]        # keep only IBOUND>0
-    gdf.to_file(shp_dir / fname)
-
-
-# Re-Read MODFLOW grid shapefile we just wrote for layer 1
-fname = f"mf_grid_{pst_run_name}_layer{1}.shp"
-grid = gpd.read_file(shp_dir / fname)
+    gdf = grid_frames.frame(array_dict, mask=array_dict['IBOUND'] != 0)
+    write_spatial(gdf, shp_dir / fname, export_formats, gpkg=grid_gpkg)
+    if k == 0:
+        grid = gdf
 
 # Read in SFR file - just the reach properties
 sfr = pd.read_csv(sfr_file, sep='\\s+', skiprows=3, names=sfr_cols, nrows=1835)
@@ -93,7 +92,7 @@ sfr = pd.read_csv(sfr_file, sep='\\s+', skiprows=3, names=sfr_cols, nrows=1835)
 sfr_shp = grid.merge(sfr, 'inner', on=['row','column'])
 
 # Write
-sfr_shp.to_file(sfr_shapefile, driver='ESRI Shapefile')
+write_spatial(sfr_shp, sfr_shapefile, export_formats)
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # What if we just plotted it _all_ in python?
@@ -1,3 +1,6 @@
+import os
+import json
+from pathlib import Path
 import pandas as pd
 import numpy as np
 
@@ -140,4 +143,229 @@ def t2p_par2par_frompar(t2p_parameters):
     df_out['Ss'] = df_out['Ss'].apply(lambda x: np.format_float_scientific(x, precision=2))
     df_out['Sy'] = df_out['Sy'].apply(lambda x: np.format_float_scientific(x, precision=2))
 
-    return df_out
\ No newline at end of file
+    return df_out
+#----------------------------------------------------------------------------------------------------------------------#
+
+def log_file_frame(df, name_col, zland_col, depth_col, data_class_cols, depth_top_col=None, x_col='X', y_col='Y'):
+    """
+    Vectorized t2py.Dataset.add_wells_by_df: one row per log interval in Texture2Par log file layout (name, ID, n,
+    X, Y, Zland, Depth, then a column per data_class_cols {class: column} key). Intervals are sorted by depth within
+    each log, and a no-data interval is inserted wherever an interval top lies below the previous bottom.
+    """
+    codes, _ = pd.factorize(df[name_col], sort=False)
+    depth = df[depth_col].to_numpy(float)
+    top = df[depth_top_col].to_numpy(float) if depth_top_col is not None else depth
+
+    #-- Intervals sorted by bottom depth within each log, then gaps: top below the previous bottom (or land surface)
+    order = np.lexsort((depth, codes))
+    first = np.r_[True, codes[order][1:] != codes[order][:-1]]
+    prev_bot = np.where(first, 0.0, np.r_[0.0, depth[order][:-1]])
+    gap = order[top[order] > prev_bot] if depth_top_col is not None else np.empty(0, dtype=int)
+
+    #-- Gap intervals (no-data, ending at the top) follow data intervals of equal depth
+    src = np.r_[np.arange(len(codes)), gap]
+    is_gap = np.r_[np.zeros(len(codes), dtype=bool), np.ones(len(gap), dtype=bool)]
+    row_depth = np.where(is_gap, top[src], depth[src])
+    final = np.lexsort((is_gap, row_depth, codes[src]))
+    src, is_gap, depth = src[final], is_gap[final], row_depth[final]
+    log = codes[src]
+    values = np.where(is_gap[:, None], np.nan, df[list(data_class_cols.values())].to_numpy(float)[src])
+
+    #-- Location & land surface from each log's first interval
+    log_first = np.unique(codes, return_index=True)[1]
+    starts = np.flatnonzero(np.r_[True, log[1:] != log[:-1]])
+
+    out = pd.DataFrame({'name': df[name_col].to_numpy()[log_first][log],
+                        'ID': log + 1,
+                        'n': np.arange(len(log)) - np.repeat(starts, np.diff(np.r_[starts, len(log)])) + 1,
+                        'X': df[x_col].to_numpy(float)[log_first][log],
+                        'Y': df[y_col].to_numpy(float)[log_first][log],
+                        'Zland': df[zland_col].to_numpy(float)[log_first][log],
+                        'Depth': depth})
+    out[list(data_class_cols.keys())] = values
+    return out
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def _format_log_rows(out, classes):
+    """ Log file lines (with newline) for rows of a log_file_frame table """
+    row = '%s\t%d\t%d\t%.5f\t%.5f\t%.5f\t%.5f' + '\t%s' * len(classes) + '\n'
+    cols = [out[c].tolist() for c in ['name', 'ID', 'n', 'X', 'Y', 'Zland', 'Depth']]
+    cols += [['%.5f' % v if v == v else '-999' for v in out[c].tolist()] for c in classes]
+    return list(map(row.__mod__, zip(*cols)))
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def write_log_file(df, filename, name_col, zland_col, depth_col, data_class_cols, depth_top_col=None,
+                   x_col='X', y_col='Y', header=None, chunksize=200000):
+    """
+    Writes a Texture2Par log file (format of t2py.Dataset.write_file) straight from a DataFrame, in large formatted
+    chunks. Arguments as log_file_frame; returns the written table.
+    """
+    out = log_file_frame(df, name_col, zland_col, depth_col, data_class_cols, depth_top_col, x_col, y_col)
+    classes = list(data_class_cols.keys())
+    if header is None:
+        header = ['Location', 'ID', 'n', 'X', 'Y', 'Zland', 'Depth'] + classes
+    with open(filename, 'w', newline='\n', buffering=1 << 22) as f:
+        f.write('\t'.join(header) + '\n')
+        for start in range(0, len(out), chunksize):
+            f.write(''.join(_format_log_rows(out.iloc[start:start + chunksize], classes)))
+    return out
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+_LOG_MANIFEST_VERSION = 1
+
+def log_hashes(df, name_col, cols):
+    """
+    Content hash per log of its rows of `cols`, in order (edits, insertions and reordering all change it).
+    Returns log names and hex hashes, in order of first appearance.
+    """
+    codes, uniques = pd.factorize(df[name_col], sort=False)
+    row_hash = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    order = np.argsort(codes, kind='stable')
+    log = codes[order]
+    starts = np.flatnonzero(np.r_[True, log[1:] != log[:-1]])
+    pos = np.arange(len(log)) - np.repeat(starts, np.diff(np.r_[starts, len(log)]))
+    mixed = pd.util.hash_array(row_hash[order] ^ (pos.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)))
+    hashes = np.add.reduceat(mixed, starts) if len(log) > 0 else np.empty(0, dtype=np.uint64)
+    hashes = pd.util.hash_array(hashes ^ np.diff(np.r_[starts, len(log)]).astype(np.uint64))
+    return ['%s' % n for n in uniques.tolist()], ['%016x' % h for h in hashes.tolist()]
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def update_log_file(df, filename, name_col, zland_col, depth_col, data_class_cols, depth_top_col=None,
+                    x_col='X', y_col='Y', header=None, manifest=None):
+    """
+    Incremental write_log_file: a JSON manifest (default <filename>.manifest.json) keeps each log's hash and byte
+    range, so only changed logs are formatted and the rest are copied. Falls back to a full write when the manifest
+    is missing or stale. Returns (logs formatted, logs copied).
+    """
+    filename = Path(filename)
+    manifest = Path(manifest) if manifest is not None else filename.with_name(filename.name + '.manifest.json')
+    classes = list(data_class_cols.keys())
+    if header is None:
+        header = ['Location', 'ID', 'n', 'X', 'Y', 'Zland', 'Depth'] + classes
+    cols = [name_col, x_col, y_col, zland_col, depth_col] + ([depth_top_col] if depth_top_col is not None else [])
+    cols += list(data_class_cols.values())
+    names, hashes = log_hashes(df, name_col, cols)
+
+    #-- Previous blocks, if the manifest still describes the file on disk
+    old, old_bytes = {}, b''
+    if manifest.exists() and filename.exists():
+        stored = json.loads(manifest.read_text())
+        stat = filename.stat()
+        if (stored.get('version') == _LOG_MANIFEST_VERSION and stored.get('header') == header and
+                stored.get('file') == [stat.st_size, stat.st_mtime_ns]):
+            old = {name: (h, start, stop, log_id) for name, h, start, stop, log_id in stored['logs']}
+            old_bytes = filename.read_bytes()
+
+    changed = np.array([old.get(name, (None,))[0] != h for name, h in zip(names, hashes)], dtype=bool)
+
+    #-- Format changed logs in one pass; their IDs are their position among all logs
+    new_blocks = {}
+    if changed.any():
+        codes = pd.factorize(df[name_col], sort=False)[0]
+        out = log_file_frame(df[changed[codes]], name_col, zland_col, depth_col, data_class_cols, depth_top_col,
+                             x_col, y_col)
+        changed_idx = np.flatnonzero(changed)
+        out['ID'] = changed_idx[out['ID'].to_numpy() - 1] + 1
+        rows = _format_log_rows(out, classes)
+        log = out['ID'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, log[1:] != log[:-1]])
+        for i, a, b in zip(changed_idx, starts, np.r_[starts[1:], len(log)]):
+            new_blocks[i] = ''.join(rows[a:b]).encode()
+
+    #-- Assemble: new blocks, or previous blocks streamed through (renumbered if their ID moved)
+    logs = []
+    tmp = filename.with_name(filename.name + '.tmp')
+    with open(tmp, 'wb', buffering=1 << 22) as f:
+        pos = f.write(('\t'.join(header) + '\n').encode())
+        for i, (name, h) in enumerate(zip(names, hashes)):
+            if changed[i]:
+                block = new_blocks[i]
+            else:
+                _, start, stop, old_id = old[name]
+                block = old_bytes[start:stop]
+                if old_id != i + 1:
+                    old_prefix, new_prefix = f'{name}\t{old_id}\t'.encode(), f'{name}\t{i + 1}\t'.encode()
+                    block = b''.join(new_prefix + line[len(old_prefix):] for line in block.splitlines(True))
+            logs.append([name, h, pos, pos + len(block), i + 1])
+            pos += f.write(block)
+    os.replace(tmp, filename)
+
+    stat = filename.stat()
+    manifest.write_text(json.dumps({'version': _LOG_MANIFEST_VERSION, 'header': header,
+                                    'file': [stat.st_size, stat.st_mtime_ns], 'logs': logs}))
+    return int(changed.sum()), int((~changed).sum())
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def dominant_texture(values):
+    """
+    Totals, dominant class index (first on ties, as idxmax) and tie flags of (ncells, nclasses) texture fractions
+    """
+    values = np.asarray(values, dtype=float)
+    total = values.sum(axis=1)
+    dominant = values.argmax(axis=1)
+    if values.shape[1] < 2:
+        return total, dominant, np.zeros(len(values), dtype=bool)
+    top2 = np.partition(values, values.shape[1] - 2, axis=1)[:, -2:]
+    return total, dominant, top2[:, 0] == top2[:, 1]
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def read_texture_model(tex_dir, classes, file_fmt='t2p_{}.csv', na_value=-999):
+    """
+    Loads the Texture2Par class files (Row, Column, X, Y, Layer1 ... LayerN) into one (nclass, nlay, nrow, ncol)
+    array (no-data as NaN), plus a (nrow, ncol) mask of the cells listed in every class file.
+    """
+    values, cells = None, None
+    for i, tex in enumerate(classes):
+        df = pd.read_csv(Path(tex_dir) / file_fmt.format(tex), na_values=na_value)
+        lay_cols = [c for c in df.columns if c.startswith('Layer')]
+        row = df.iloc[:, 0].to_numpy() - 1
+        col = df.iloc[:, 1].to_numpy() - 1
+        if values is None:
+            values = np.full((len(classes), len(lay_cols), row.max() + 1, col.max() + 1), np.nan)
+            cells = np.zeros(values.shape[2:], dtype=int)
+        values[i][:, row, col] = df[lay_cols].to_numpy(float).T
+        cells[row, col] += 1
+    return values, cells == len(classes)
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def read_texture_results(tex_dir, classes, file_fmt='t2p_{}.csv', na_value=-999, cache=False):
+    """
+    Loads Texture2Par results as one (ncell * nlay, nclass) array, cells in file order layer by layer. With
+    cache=True the array is kept as an .npz in tex_dir and re-used until a class file changes.
+    """
+    tex_dir = Path(tex_dir)
+    files = [tex_dir / file_fmt.format(tex) for tex in classes]
+    cache_file = tex_dir / (Path(file_fmt.format('results')).stem + '.npz')
+    stamp = np.array([[st.st_size, st.st_mtime_ns] for st in (f.stat() for f in files)], dtype=np.int64)
+
+    if cache and cache_file.exists():
+        with np.load(cache_file, allow_pickle=False) as npz:
+            if npz['classes'].tolist() == list(classes) and np.array_equal(npz['stamp'], stamp):
+                return npz['values']
+
+    values = None
+    for i, f in enumerate(files):
+        df = pd.read_csv(f, na_values=na_value)
+        block = df[[c for c in df.columns if c.startswith('Layer')]].to_numpy(float)
+        if values is None:
+            values = np.empty((block.size, len(classes)))
+        values[:, i] = block.ravel(order='F')
+
+    if cache:
+        np.savez(cache_file, values=values, stamp=stamp, classes=np.array(classes))
+    return values
+
+#----------------------------------------------------------------------------------------------------------------------#
+
+def texture_model_summary(values):
+    """ Totals, dominant class and ties, (nlay, nrow, ncol) each, of read_texture_model values (NaN as zero) """
+    shape = values.shape[1:]
+    flat = np.nan_to_num(values, nan=0.0).reshape(values.shape[0], -1).T
+    return tuple(a.reshape(shape) for a in dominant_texture(flat))
@@ -0,0 +1,169 @@
+"""
+Headless, parallel rendering of flight line section figures (see aem_plot.section_figure.SectionFigure).
+
+Lines are split across worker processes, each of which runs this module with the non-interactive Agg backend and
+owns a single SectionFigure that it updates in place for every line it is given. Workers are started as fresh
+interpreters (`python -m aem_plot.batch`), so the calling script is never re-imported by the children.
+
+With a manifest file, each line's plotted data and styling is hashed and lines that have not changed since the
+last run are skipped.
+"""
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from matplotlib.colors import Colormap, Normalize
+
+# Bump when SectionFigure output changes, so stored manifests no longer match
+_HASH_VERSION = 1
+
+
+def _render(spec, jobs):
+    from aem_plot.section_figure import SectionFigure
+    sfig = SectionFigure(spec['panels'], spec['lines'], line_col=spec['line_col'], domain=spec['domain'],
+                         doi_alpha=spec['doi_alpha'], raster=spec.get('raster'))
+    for name, fmt, lw in spec['overlays']:
+        sfig.add_overlay(name, fmt=fmt, lw=lw)
+    for job in jobs:
+        sfig.update(job['rect'], job['values'], xlim=job.get('xlim'), ylim=job.get('ylim'),
+                    title=job.get('title'), doi_values=job.get('doi_values'))
+        for name, _, _ in spec['overlays']:
+            sfig.set_overlay(name, *job.get('overlays', {}).get(name, ([], [])))
+        sfig.highlight_line(job.get('line'), job.get('point_xy'))
+        sfig.savefig(job['filename'], dpi=spec['dpi'])
+
+
+def _split_jobs(jobs, nproc):
+    """ Longest-first greedy split on pixel count, so workers finish at about the same time """
+    bins = [[] for _ in range(nproc)]
+    load = np.zeros(nproc)
+    for i in sorted(range(len(jobs)), key=lambda i: -len(jobs[i]['rect'])):
+        k = int(np.argmin(load))
+        bins[k].append(jobs[i])
+        load[k] += len(jobs[i]['rect'])
+    return [b for b in bins if len(b) > 0]
+
+
+def _hash_update(h, obj):
+    """ Feeds plotted data & styling into a hash in a stable way (arrays by value, colormaps by lookup table) """
+    if isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            h.update(str(key).encode())
+            _hash_update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f'seq{len(obj)}'.encode())
+        for item in obj:
+            _hash_update(h, item)
+    elif isinstance(obj, Colormap):
+        h.update(obj.name.encode())
+        _hash_update(h, obj(np.linspace(0, 1, 256)))
+    elif isinstance(obj, Normalize):
+        h.update(f'{type(obj).__name__}{obj.vmin}{obj.vmax}{obj.clip}'.encode())
+    elif isinstance(obj, gpd.GeoDataFrame):
+        _hash_update(h, list(obj.columns))
+        _hash_update(h, obj.geometry.to_wkb().tolist())
+        _hash_update(h, [obj[c].to_numpy() for c in obj.columns if c != obj.geometry.name])
+    elif isinstance(obj, bytes):
+        h.update(obj)
+    elif isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        arr = np.asarray(obj)
+        if arr.dtype == object:
+            _hash_update(h, [str(v) for v in arr.ravel()])
+        else:
+            h.update(f'{arr.dtype}{arr.shape}'.encode())
+            h.update(np.ascontiguousarray(arr).tobytes())
+    else:
+        h.update(repr(obj).encode())
+
+
+def section_hash(job, spec_hash=''):
+    """ Content hash of one line figure: its data (job) plus the shared figure styling (spec_hash) """
+    h = hashlib.sha1(f'{_HASH_VERSION}{spec_hash}'.encode())
+    _hash_update(h, {k: v for k, v in job.items() if k != 'filename'})
+    return h.hexdigest()
+
+
+def _dispatch(spec, jobs, processes):
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        _render(spec, jobs)
+        return
+
+    pkg_dir = str(Path(__file__).resolve().parents[1])
+    env = dict(os.environ, MPLBACKEND='Agg')
+    env['PYTHONPATH'] = os.pathsep.join([pkg_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workers = []
+        for i, chunk in enumerate(_split_jobs(jobs, processes)):
+            job_file = Path(tmp) / f'jobs_{i}.pkl'
+            with open(job_file, 'wb') as f:
+                pickle.dump((spec, chunk), f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Output goes to a log file per worker (not a pipe), so no worker blocks on a full pipe buffer
+            with open(Path(tmp) / f'worker_{i}.log', 'w') as log:
+                workers.append(subprocess.Popen([sys.executable, '-m', 'aem_plot.batch', str(job_file)],
+                                                env=env, stdout=log, stderr=subprocess.STDOUT))
+        errors = []
+        for i, proc in enumerate(workers):
+            if proc.wait() != 0:
+                log = (Path(tmp) / f'worker_{i}.log').read_text(errors='replace')
+                errors.append(f'Worker {i} failed (exit code {proc.returncode}):\n{log}')
+    if errors:
+        raise RuntimeError('\n'.join(errors))
+
+
+def render_sections(jobs, panels, lines, line_col='SUBLINE_NO', domain=None, doi_alpha=0.45, overlays=(),
+                    dpi=300, processes=None, manifest=None, raster=None):
+    """
+    Renders one SectionFigure PNG per job, spread over `processes` worker processes.
+
+    Parameters:
+        jobs: list of dicts, one per line, with keys
+              filename (required), rect (required, from df2polyverts), values (required, one array per panel),
+              xlim, ylim, title, doi_values, line (highlighted on map), point_xy (map marker),
+              overlays ({name: (x, y)})
+        panels, lines, line_col, domain, doi_alpha, raster: passed to SectionFigure
+        overlays: list of (name, fmt, lw) overlay lines added to every panel
+        dpi: resolution of the saved figures
+        processes: number of worker processes (default: all cores). 1 renders in this process.
+        manifest: optional JSON file of {filename: content hash}. Lines whose data & styling hash matches the
+                  stored one (and whose PNG still exists) are skipped; the manifest is updated after rendering.
+    Returns:
+        list of output filenames that were (re)rendered, in job order
+    """
+    spec = {'panels': panels, 'lines': lines, 'line_col': line_col, 'domain': domain, 'doi_alpha': doi_alpha,
+            'overlays': list(overlays), 'dpi': dpi, 'raster': raster}
+
+    if manifest is not None:
+        manifest = Path(manifest)
+        stored = json.loads(manifest.read_text()) if manifest.exists() else {}
+        h = hashlib.sha1()
+        _hash_update(h, spec)
+        hashes = [section_hash(job, h.hexdigest()) for job in jobs]
+        todo = [(job, hsh) for job, hsh in zip(jobs, hashes)
+                if stored.get(str(job['filename'])) != hsh or not Path(job['filename']).exists()]
+        jobs = [job for job, _ in todo]
+
+    if len(jobs) > 0:
+        _dispatch(spec, jobs, processes)
+
+    if manifest is not None:
+        stored.update({str(job['filename']): hsh for job, hsh in todo})
+        manifest.write_text(json.dumps(stored, indent=1, sort_keys=True))
+    return [job['filename'] for job in jobs]
+
+
+if __name__ == '__main__':
+    import matplotlib
+    matplotlib.use('Agg')
+    with open(sys.argv[1], 'rb') as f:
+        spec, jobs = pickle.load(f)
+    _render(spec, jobs)
@@ -0,0 +1,174 @@
+"""
+Interactive (Jupyter) flight line browser.
+
+Soundings are kept in a SoundingStore, a long table (one row per pixel) sorted and indexed by line, so a single
+line is a slice (in memory) or a filtered row-group read (parquet on disk). LineBrowser shows the selected line's
+sections (a SectionFigure, set up like the batch PNGs) next to a LinesMap and only swaps arrays on the existing
+artists when the line changes; recently viewed lines are kept in an LRU cache.
+
+Example (in a notebook, with %matplotlib widget):
+    store = SoundingStore(aem_long, line_col='SUBLINE_NO')
+    browser = LineBrowser(store, aem_line_shp, panels=[{'col': 'RHO_I', 'cmap': 'turbo', 'clim': (1, 1000)}],
+                          doi_col='doi_elev', overlays={'doi': ('LINE_DIST', 'doi_elev', 'k:')},
+                          map_kwargs={'n_arrow_x': ..., 'n_arrow_y': ..., 'scalebar_x': ..., 'scalebar_y': ...})
+    browser.widget()
+"""
+
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from aem_plot.line_map import LinesMap
+from aem_plot.section_figure import SectionFigure
+from aem_plot.utils import df2polyverts
+
+
+class SoundingStore(object):
+    """
+    Long sounding table indexed by line. Built from a DataFrame (held in memory, lines are sliced out by position)
+    or opened from a parquet file written by to_parquet() (only the line column is read up front, each line is
+    read on demand from its row groups).
+
+    Parameters:
+        df: long DataFrame, one row per pixel
+        line_col: column identifying each (sub)line
+        sort_col: column to order soundings along a line
+    """
+    def __init__(self, df=None, line_col='SUBLINE_NO', sort_col='LINE_DIST'):
+        self.line_col = line_col
+        self.sort_col = sort_col
+        self.path = None
+        self.df = None
+        if df is not None:
+            self.df = df.sort_values([line_col, sort_col], kind='stable').reset_index(drop=True)
+            self._index(self.df[line_col].to_numpy())
+
+    def _index(self, keys):
+        self.lines, starts = np.unique(keys, return_index=True)
+        stops = np.r_[starts[1:], len(keys)]
+        self._slices = {lne: slice(a, b) for lne, a, b in zip(self.lines.tolist(), starts, stops)}
+
+    @classmethod
+    def open(cls, path, line_col='SUBLINE_NO', sort_col='LINE_DIST'):
+        store = cls(None, line_col, sort_col)
+        store.path = Path(path)
+        store._index(pd.read_parquet(store.path, columns=[line_col])[line_col].to_numpy())
+        return store
+
+    def to_parquet(self, path, row_group_size=50000):
+        """ Writes the sorted table, so reads filtered on the line column only touch that line's row groups """
+        self.df.to_parquet(path, index=False, row_group_size=row_group_size)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, line):
+        return line in self._slices
+
+    def line(self, line):
+        """ Returns the soundings of one line, ordered along the line """
+        if line not in self._slices:
+            raise KeyError(f'Line not in store: {line}')
+        if self.df is not None:
+            return self.df.iloc[self._slices[line]]
+        return pd.read_parquet(self.path, filters=[(self.line_col, '==', line)])
+
+
+class LineBrowser(object):
+    """
+    Section panels + LinesMap for one line at a time. The section panels, norms, colorbars and overlays are a
+    SectionFigure (the same figure setup as the batch PNGs, see aem_plot.batch); the map panel is a LinesMap.
+    show() only swaps arrays, limits and titles, and prepared line data is kept in an LRU cache.
+
+    Parameters:
+        store: SoundingStore
+        lines: GeoDataFrame of flight lines (with store.line_col) for the map
+        panels: list of dicts, one per section panel, with key col (required) and the SectionFigure panel options
+                (cmap, norm, clim, colorbar_label (default: col), ylabel)
+        x_col, y_col, xthk_col, ythk_col: rectangle columns (see df2polyverts)
+        doi_col: column of DOI elevations for the DOI fade (optional)
+        doi_alpha: alpha for rectangles below the DOI
+        overlays: {name: (x_col, y_col, fmt)} lines drawn on every panel, e.g. DOI or bottom elevations
+        points: GeoDataFrame of sounding locations (with store.line_col) highlighted with the line (optional)
+        map_kwargs: passed to LinesMap (n_arrow_x, n_arrow_y, scalebar_x, scalebar_y, img, img_extent)
+        cache_size: number of prepared lines kept in memory
+        raster: passed to SectionFigure (None = one polygon per pixel)
+    """
+    def __init__(self, store, lines, panels, x_col='LINE_DIST', y_col='BOT_ELEV', xthk_col='LINE_WIDTH',
+                 ythk_col='THK', doi_col=None, doi_alpha=0.45, overlays=None, points=None, map_kwargs=None,
+                 cache_size=32, figsize=(12, 8), width_ratios=(5, 2), raster=None):
+        self.store = store
+        self.cols = (x_col, y_col, xthk_col, ythk_col)
+        self.value_cols = [p['col'] for p in panels]
+        self.doi_col = doi_col
+        self.overlay_cols = overlays or {}
+        self.line = None
+
+        #-- Sections: shared SectionFigure setup, map panel left for the LinesMap
+        self.sfig = SectionFigure([dict(p, colorbar_label=p.get('colorbar_label', p['col'])) for p in panels], None,
+                                  doi_alpha=doi_alpha, hide_xticks=False, figsize=figsize,
+                                  width_ratios=width_ratios, raster=raster)
+        self.fig, self.axd = self.sfig.fig, self.sfig.axd
+        for name, (_, _, fmt) in self.overlay_cols.items():
+            self.sfig.add_overlay(name, fmt=fmt)
+
+        #-- Map (LinesMap colors lines by index). The line's soundings are a separate small artist on top of the
+        #-- grey survey points, so switching lines never restyles every point
+        self.map = LinesMap(self.axd['map'], lines.set_index(store.line_col, drop=False), points=points,
+                            **(map_kwargs or {}))
+        self.point_xy = {}
+        if points is not None:
+            xy = np.column_stack([points.geometry.x, points.geometry.y])
+            for lne, idx in points.groupby(store.line_col).indices.items():
+                self.point_xy[lne] = xy[idx]
+        self.line_point = self.axd['map'].plot([], [], 'o', color='r', ms=2, scalex=False, scaley=False)[0]
+
+        self._prepared = lru_cache(maxsize=cache_size)(self._prepare)
+
+    def _prepare(self, line):
+        """ Everything needed to draw a line, as plain arrays (cached) """
+        df = self.store.line(line)
+        x_col, y_col, xthk_col, ythk_col = self.cols
+        df = df.dropna(subset=[y_col, ythk_col])
+        rect = df2polyverts(df, x_col, y_col, xthk_col, ythk_col)
+        doi = df[self.doi_col].to_numpy(float) if self.doi_col is not None else None
+        overlays = {}
+        for name, (ox, oy, _) in self.overlay_cols.items():
+            odf = df.drop_duplicates(subset=ox)
+            overlays[name] = (odf[ox].to_numpy(float), odf[oy].to_numpy(float))
+        xlim = (rect[:, 0, 0].min(), rect[:, 1, 0].max()) if len(rect) > 0 else None
+        ylim = (rect[:, 0, 1].min(), rect[:, 2, 1].max()) if len(rect) > 0 else None
+        values = [df[c].to_numpy(float) for c in self.value_cols]
+        return rect, values, doi, overlays, xlim, ylim
+
+    def show(self, line):
+        """ Swaps the displayed line """
+        rect, values, doi, overlays, xlim, ylim = self._prepared(line)
+        self.sfig.update(rect, values, xlim=xlim, ylim=ylim, title=f'Flight Line: {line}', doi_values=doi)
+        for name, (x, y) in overlays.items():
+            self.sfig.set_overlay(name, x, y)
+        self.map.color_line(line)
+        self.line_point.set_data(*self.point_xy.get(line, np.empty((0, 2))).T)
+        self.line = line
+        self.fig.canvas.draw_idle()
+
+    def widget(self, start=None):
+        """ Dropdown + previous/next buttons driving show(). Requires ipywidgets and an interactive backend """
+        import ipywidgets as widgets
+
+        options = self.store.lines.tolist()
+        dropdown = widgets.Dropdown(options=options, value=options[0] if start is None else start,
+                                    description='Line:')
+        prev_btn = widgets.Button(description='<', layout=widgets.Layout(width='3em'))
+        next_btn = widgets.Button(description='>', layout=widgets.Layout(width='3em'))
+
+        def step(n):
+            i = options.index(dropdown.value) + n
+            dropdown.value = options[min(max(i, 0), len(options) - 1)]
+
+        dropdown.observe(lambda change: self.show(change['new']), names='value')
+        prev_btn.on_click(lambda _: step(-1))
+        next_btn.on_click(lambda _: step(1))
+        self.show(dropdown.value)
+        return widgets.HBox([prev_btn, dropdown, next_btn])
@@ -1,4 +1,6 @@
+import numpy as np
 import geopandas as gpd
+from matplotlib.colors import to_rgba
 from aem_plot.scalebar import add_scalebar, add_northarrow
 
 class LinesMap(object):
@@ -8,31 +10,37 @@ class LinesMap(object):
         self.line_gdf['c'] = 'grey'
         if img is not None:
             ax.imshow(img, extent=img_extent)
+        #-- Keep the handles of our own artists (the axes may already hold others)
+        n = len(ax.collections)
         self.line_gdf.plot(ax=ax, color=self.line_gdf['c'], lw=1)
-        self.lines = ax.collections[0]
+        self.lines = ax.collections[n]
         ax.set_axis_off()
         if points is not None:
             self.point_gdf = points
             self.point_gdf['c'] = 'lightgrey'
-            self.point_gdf.plot(ax=ax, color=self.point_gdf['c'], markersize=2)
-            self.points = ax.collections[1]
+            n = len(ax.collections)
+            self.point_gdf.plot(ax=ax, color='lightgrey', markersize=2)
+            self.points = ax.collections[n]
         add_northarrow(ax, n_arrow_x, n_arrow_y)
         add_scalebar(ax, scalebar_x, scalebar_y, 2)
-        ax.set_xlim(img_extent[0:2])
-        ax.set_ylim(img_extent[2:4])
+        if img_extent is not None:
+            ax.set_xlim(img_extent[0:2])
+            ax.set_ylim(img_extent[2:4])
+
+    @staticmethod
+    def _selected(gdf, sel):
+        """ Boolean mask from index label(s) or a boolean array """
+        sel = np.asarray(sel)
+        if sel.dtype == bool and sel.shape == (len(gdf),):
+            return sel
+        return gdf.index.isin(np.atleast_1d(sel))
 
     def color_line(self, line, color='b', width=2):
-        self.line_gdf['c'] = 'grey'
-        self.line_gdf.loc[line, 'c'] = color
-        self.line_gdf['w'] = 1
-        self.line_gdf.loc[line, 'w'] = width
-        self.lines.set_colors(self.line_gdf['c'])
-        self.lines.set_linewidths(self.line_gdf['w'])
+        sel = self._selected(self.line_gdf, line)
+        self.lines.set_colors(np.where(sel[:, None], to_rgba(color), to_rgba('grey')))
+        self.lines.set_linewidths(np.where(sel, width, 1))
 
     def color_points(self, points, color='r', markersize=3):
-        self.point_gdf['c'] = 'lightgrey'
-        self.point_gdf.loc[points, 'c'] = color
-        self.point_gdf['w'] = 1
-        self.point_gdf.loc[points, 'mks'] = markersize
-        self.points.set_color(self.point_gdf['c'])
-        self.points.set_linewidths(self.point_gdf['mks'])
+        sel = self._selected(self.point_gdf, points)
+        self.points.set_color(np.where(sel[:, None], to_rgba(color), to_rgba('lightgrey')))
+        self.points.set_linewidths(np.where(sel, markersize, 1))
@@ -0,0 +1,142 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection, LineCollection
+
+from aem_plot.utils import rect_bottom_height, doi_alphas, raster_weights, raster_values
+
+
+class SectionFigure(object):
+    """
+    Multi-panel flight line section figure (stacked sections + map) that is built once and updated in place for
+    each line. Collections, colorbars, overlay lines and map artists are all created in __init__; update(),
+    set_overlay() and highlight_line() only swap arrays, limits and titles before savefig().
+
+    Parameters:
+        panels: list of dicts, one per section panel (top to bottom), with optional keys
+                cmap, norm, clim, colorbar_label, ylabel
+        lines: GeoDataFrame of flight lines for the map panel, or None to leave the map panel (axd['map']) to the
+               caller (e.g. LineBrowser draws a LinesMap there)
+        line_col: column in `lines` identifying each (sub)line
+        domain: GeoDataFrame plotted underneath the lines on the map (optional)
+        doi_alpha: alpha for rectangles below the DOI (only used when doi_values are passed to update)
+        hide_xticks: whether to hide x-axis tick labels on the section panels
+        raster: None to draw one polygon per pixel, or dict of raster_weights options (method, dx, dz) to draw
+                each section as a resampled image instead
+    """
+    def __init__(self, panels, lines, line_col='SUBLINE_NO', domain=None, doi_alpha=0.45,
+                 hide_xticks=True, figsize=(14, 10), width_ratios=(6, 2), raster=None):
+        self.panels = [f'p{i+1}' for i in range(len(panels))]
+        self.fig, self.axd = plt.subplot_mosaic([[p, 'map'] for p in self.panels],
+                                                gridspec_kw={'width_ratios': list(width_ratios)},
+                                                constrained_layout=True, figsize=figsize)
+        self.doi_alpha = doi_alpha
+        self.raster = raster
+        self.clims = {}
+        self.collections = {}
+        self.colorbars = {}
+        self.overlays = {}
+
+        #-- Sections
+        for key, opts in zip(self.panels, panels):
+            ax = self.axd[key]
+            if raster is None:
+                coll = PolyCollection(np.empty((0, 4, 2)), cmap=opts.get('cmap', 'viridis'), norm=opts.get('norm'))
+                coll.set_array(np.empty(0))
+                # RGBA base color: keeps set_alpha() with per-face DOI alphas vectorized (a color name is expanded
+                # per face)
+                coll.set_facecolor(np.zeros((1, 4)))
+                ax.add_collection(coll)
+            else:
+                coll = ax.imshow(np.ma.masked_all((1, 1)), origin='lower', aspect='auto', interpolation='nearest',
+                                 cmap=opts.get('cmap', 'viridis'), norm=opts.get('norm'))
+            self.clims[key] = opts.get('clim')
+            if self.clims[key] is not None:
+                coll.set_clim(self.clims[key])
+            ax.set_ylabel(opts.get('ylabel', 'Elevation (m)'))
+            self.collections[key] = coll
+            self.colorbars[key] = self.fig.colorbar(coll, ax=ax, label=opts.get('colorbar_label'))
+            if hide_xticks:
+                ax.get_xaxis().set_ticklabels([])
+
+        #-- Map
+        mapax = self.axd['map']
+        self.line_segments = {}
+        if lines is not None:
+            if domain is not None:
+                domain.plot(color='lightgray', ax=mapax)
+            lines.plot(color='darkgray', ax=mapax)
+            mapax.set_axis_off()
+            for lne, geom in zip(lines[line_col], lines.geometry):
+                parts = getattr(geom, 'geoms', [geom])
+                self.line_segments.setdefault(lne, []).extend(np.asarray(g.coords)[:, :2] for g in parts)
+            # Freeze map extent so highlighted lines/points never rescale it (keeps output independent of line order)
+            mapax.set(xlim=mapax.get_xlim(), ylim=mapax.get_ylim())
+            self.line_highlight = LineCollection([], colors='black', linewidths=1.5)
+            mapax.add_collection(self.line_highlight, autolim=False)
+            self.map_point = mapax.plot([], [], 'o', color='black', scalex=False, scaley=False)[0]
+        else:
+            self.line_highlight, self.map_point = None, None
+
+        # Starting axes positions; constrained layout is re-run from these for every line (see savefig)
+        self._positions = [(ax, ax.get_position(original=True).frozen(), ax.get_in_layout()) for ax in self.fig.axes]
+
+    def add_overlay(self, name, fmt='r--', lw=0.9, panels=None):
+        """ Creates an (initially empty) overlay line, e.g. DOI or water table, on each section panel """
+        panels = self.panels if panels is None else panels
+        self.overlays[name] = [self.axd[key].plot([], [], fmt, lw=lw)[0] for key in panels]
+
+    def set_overlay(self, name, x, y):
+        for ln in self.overlays[name]:
+            ln.set_data(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    def update(self, rect, values, xlim=None, ylim=None, title=None, doi_values=None):
+        """
+        Swaps in a new line's geometry and values.
+
+        Parameters:
+            rect: (n, 4, 2) vertex array from df2polyverts
+            values: list of value arrays, one per panel
+            xlim, ylim: axis limits for all section panels
+            title: title for the top panel
+            doi_values: array of DOI elevations for the optional DOI fade
+        """
+        alphas = None
+        if doi_values is not None:
+            alphas = doi_alphas(*rect_bottom_height(rect), doi_values, self.doi_alpha)
+            if np.all(alphas == 1.0):
+                alphas = None
+        if self.raster is not None:
+            #-- One raster lookup per line, shared by all panels and the DOI fade
+            idx, weights, extent = raster_weights(rect, **self.raster)
+            if alphas is not None:
+                alphas = raster_values(alphas, idx, weights).filled(1.0)
+        for key, vals in zip(self.panels, values):
+            coll = self.collections[key]
+            if self.raster is None:
+                coll.set_verts(rect)
+                coll.set_array(np.asarray(vals, dtype=float))
+            else:
+                coll.set_data(raster_values(vals, idx, weights))
+                coll.set_extent(extent)
+            coll.set_alpha(alphas)
+            if self.clims[key] is None:
+                coll.autoscale()
+            self.axd[key].set(xlim=xlim, ylim=ylim)
+        self.axd[self.panels[0]].set_title(title)
+
+    def highlight_line(self, line, point_xy=None):
+        """ Highlights a line (and optionally a point) on the map panel (needs the lines passed to __init__) """
+        if self.line_highlight is None:
+            raise ValueError('SectionFigure was built without lines: no map panel to highlight on')
+        self.line_highlight.set_segments(self.line_segments.get(line, []))
+        if point_xy is not None:
+            self.map_point.set_data(*[np.atleast_1d(c) for c in point_xy])
+        else:
+            self.map_point.set_data([], [])
+
+    def savefig(self, filename, dpi=300, **kwargs):
+        # Constrained layout converges from the current positions, so start each line from the same state
+        for ax, pos, in_layout in self._positions:
+            ax.set_position(pos)
+            ax.set_in_layout(in_layout)  # set_position takes the axes out of the layout, put them back
+        self.fig.savefig(filename, dpi=dpi, **kwargs)
@@ -2,19 +2,211 @@
 Some of these functions were originally written by Michael Ou of S.S. Papadopulos & Assoc.
 """
 
+import numpy as np
 from matplotlib.patches import Rectangle
-from matplotlib.collections import PatchCollection
+from matplotlib.collections import PatchCollection, PolyCollection
 
 def df2rectangles(df, x_col, y_col, xthk_col, ythk_col):
     return df.apply(lambda p: Rectangle((p[x_col], p[y_col]), p[xthk_col], p[ythk_col]), axis=1)
 
 
+def df2polyverts(df, x_col, y_col, xthk_col, ythk_col):
+    """
+    Vectorized alternative to df2rectangles. Returns an (n, 4, 2) array of rectangle vertices (counter-clockwise
+    from the lower left corner) that can be passed as `rect` to the plot_slice_rect functions.
+    """
+    x0 = df[x_col].to_numpy(float)
+    y0 = df[y_col].to_numpy(float)
+    x1 = x0 + df[xthk_col].to_numpy(float)
+    y1 = y0 + df[ythk_col].to_numpy(float)
+    verts = np.empty((len(x0), 4, 2))
+    verts[:, 0, 0], verts[:, 0, 1] = x0, y0
+    verts[:, 1, 0], verts[:, 1, 1] = x1, y0
+    verts[:, 2, 0], verts[:, 2, 1] = x1, y1
+    verts[:, 3, 0], verts[:, 3, 1] = x0, y1
+    return verts
+
+
+def rect_collection(rect, cmap='viridis', norm=None):
+    """ Builds a single PolyCollection from a vertex array, or a PatchCollection from Rectangle objects """
+    if isinstance(rect, np.ndarray):
+        return PolyCollection(rect, cmap=cmap, norm=norm)
+    return PatchCollection(rect, cmap=cmap, norm=norm)
+
+
+def rect_bottom_height(rect):
+    """ Returns arrays of rectangle bottoms and heights from a vertex array or a collection of Rectangles """
+    if isinstance(rect, np.ndarray):
+        return rect[:, 0, 1], rect[:, 2, 1] - rect[:, 0, 1]
+    bottom = np.array([r.get_y() for r in rect], dtype=float)
+    height = np.array([r.get_height() for r in rect], dtype=float)
+    return bottom, height
+
+
+def doi_alphas(bottom, height, doi_values, doi_alpha=0.45):
+    """
+    Vectorized per-rectangle alpha values: 1.0 for rectangles reaching above the DOI, doi_alpha for rectangles
+    below it, and a linear blend for those partially intersecting it.
+    """
+    bottom = np.asarray(bottom, dtype=float)
+    height = np.asarray(height, dtype=float)
+    doi = np.asarray(doi_values, dtype=float)
+    top = bottom + height
+    with np.errstate(divide='ignore', invalid='ignore'):
+        partial = doi_alpha + (1 - doi_alpha) * (doi - bottom) / height
+    return np.select([top >= doi, bottom <= doi], [1.0, doi_alpha], default=partial)
+
+
+def _rect_edges(rect):
+    """ Left, right, bottom and top edges from a vertex array or a collection of Rectangles """
+    if isinstance(rect, np.ndarray):
+        return rect[:, 0, 0], rect[:, 1, 0], rect[:, 0, 1], rect[:, 2, 1]
+    x0 = np.array([r.get_x() for r in rect], dtype=float)
+    y0 = np.array([r.get_y() for r in rect], dtype=float)
+    x1 = x0 + np.array([r.get_width() for r in rect], dtype=float)
+    y1 = y0 + np.array([r.get_height() for r in rect], dtype=float)
+    return x0, x1, y0, y1
+
+
+def raster_weights(rect, dx=None, dz=None, method='nearest', max_cells=(4000, 2000)):
+    """
+    Resamples a line section (columns of stacked rectangles, one column per sounding) onto a regular
+    distance x elevation raster. Returns the rectangle indices & weights of every raster cell, so several value
+    arrays (e.g. panels, DOI alphas) can be mapped with raster_values() without repeating the lookup.
+
+    Parameters:
+        rect: (n, 4, 2) vertex array from df2polyverts, or collection of Rectangles
+        dx, dz: raster cell size (default: narrowest sounding & thinnest layer, a quarter of that for bilinear)
+        method: 'nearest' (exact copy of the rectangles) or 'bilinear' (between sounding/layer centers)
+        max_cells: upper limit on the number of raster (columns, rows) when dx/dz are defaulted
+    Returns:
+        idx: (k, nz, nx) rectangle indices, -1 outside the section (k=1 nearest, k=4 bilinear)
+        weights: (k, nz, nx) weights summing to one in each cell
+        extent: (left, right, bottom, top) for imshow(origin='lower')
+    """
+    if method not in ('nearest', 'bilinear'):
+        raise ValueError(f'Unknown raster method: {method}')
+    x0, x1, y0, y1 = _rect_edges(rect)
+    xmin, xmax, ymin, ymax = x0.min(), x1.max(), y0.min(), y1.max()
+    #-- Bilinear needs several cells per rectangle to show the gradient
+    refine = 1 if method == 'nearest' else 4
+    if dx is None:
+        dx = max(np.min(x1 - x0) / refine, (xmax - xmin) / max_cells[0])
+    if dz is None:
+        dz = max(np.min(y1 - y0) / refine, (ymax - ymin) / max_cells[1])
+    nx = max(int(np.ceil((xmax - xmin) / dx - 1e-9)), 1)
+    nz = max(int(np.ceil((ymax - ymin) / dz - 1e-9)), 1)
+    xc = xmin + (np.arange(nx) + 0.5) * dx
+    zc = ymin + (np.arange(nz) + 0.5) * dz
+
+    #-- Soundings (columns) and their horizontal extent
+    cols, col_of = np.unique(x0, return_inverse=True)
+    col_x1 = np.zeros(len(cols))
+    np.maximum.at(col_x1, col_of, x1)
+
+    #-- Rectangles sorted by (sounding, elevation) so one searchsorted finds the layer in every sounding
+    span = 2 * (ymax - ymin) + 1
+    def layer_lookup(s, z, ref):
+        order = np.lexsort((ref, col_of))
+        keys = col_of[order] * span + (ref[order] - ymin)
+        pos = np.searchsorted(keys, s * span + (z - ymin), side='right') - 1
+        return order, pos
+
+    s = np.clip(np.searchsorted(cols, xc, side='right') - 1, 0, None)
+    covered = (xc >= cols[s]) & (xc < col_x1[s])
+    s = np.broadcast_to(s, (nz, nx))
+    order, pos = layer_lookup(s, zc[:, None], y0)
+    near = order[np.clip(pos, 0, None)]
+    inside = covered & (pos >= 0) & (col_of[near] == s) & (zc[:, None] < y1[near])
+    near = np.where(inside, near, -1)
+    extent = (xmin, xmin + nx * dx, ymin, ymin + nz * dz)
+    if method == 'nearest':
+        return near[None], inside[None].astype(float), extent
+
+    #-- Bilinear: horizontal neighbours between sounding centers (not across gaps), then layer centers
+    xmid = (cols + col_x1) / 2
+    sl = np.clip(np.searchsorted(xmid, xc, side='right') - 1, 0, len(cols) - 1)
+    sr = np.clip(sl + 1, 0, len(cols) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx = np.clip((xc - xmid[sl]) / (xmid[sr] - xmid[sl]), 0, 1)
+    tx = np.where(sr == sl, 0.0, tx)
+    gap = col_x1[sl] < cols[sr] - 1e-6 * dx
+    tx = np.where(gap, (s[0] == sr).astype(float), tx)
+
+    ymid = (y0 + y1) / 2
+    idx, weights = [], []
+    for sc, wx in ((sl, 1 - tx), (sr, tx)):
+        sc = np.broadcast_to(sc, (nz, nx))
+        order, pos = layer_lookup(sc, zc[:, None], ymid)
+        lo = order[np.clip(pos, 0, None)]
+        hi = order[np.clip(pos + 1, 0, len(order) - 1)]
+        lo_ok = (pos >= 0) & (col_of[lo] == sc)
+        hi_ok = (pos + 1 < len(order)) & (col_of[hi] == sc)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tz = np.clip((zc[:, None] - ymid[lo]) / (ymid[hi] - ymid[lo]), 0, 1)
+        tz = np.where(lo_ok & hi_ok, tz, np.where(hi_ok, 1.0, 0.0))
+        lo = np.where(lo_ok, lo, hi)
+        hi = np.where(hi_ok, hi, lo)
+        idx += [lo, hi]
+        weights += [wx * (1 - tz), wx * tz]
+    idx = np.where(inside, np.stack(idx), -1)
+    weights = np.where(inside, np.stack(weights), 0.0)
+    return idx, weights, extent
+
+
+def raster_values(values, idx, weights):
+    """ Maps per-rectangle values onto the raster from raster_weights(). NaN values & outside cells are masked """
+    values = np.asarray(values, dtype=float)
+    vals = values[np.clip(idx, 0, None)]
+    w = np.where((idx >= 0) & np.isfinite(vals), weights, 0.0)
+    wsum = w.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grid = (w * np.where(w > 0, vals, 0.0)).sum(axis=0) * np.where(wsum > 0, 1 / wsum, 0)
+    return np.ma.masked_where(wsum <= 0, grid)
+
+
+def plot_slice_raster(fig, ax, rect, values, doi_values=None, doi_alpha=0.45, cmap='viridis', norm=None,
+                      title=None, xlim=None, ylim=None, xlabel=None, ylabel=None,
+                      colorbar_label=None, hide_xticks=False, clim: tuple = None,
+                      method='nearest', dx=None, dz=None):
+    """
+    Raster alternative to plot_slice_rect_doi: resamples the section onto a regular grid (see raster_weights)
+    and draws it as a single image. Much faster to draw/save and smaller files for long lines. Overlays from
+    plot_line_by_depth/plot_wl can be added afterwards as usual.
+
+    Parameters:
+        as plot_slice_rect_doi, plus
+        method: 'nearest' or 'bilinear'
+        dx, dz: raster cell size (see raster_weights)
+    Returns:
+        image, colorbar
+    """
+    ax.clear()
+    idx, weights, extent = raster_weights(rect, dx=dx, dz=dz, method=method)
+    img = ax.imshow(raster_values(values, idx, weights), extent=extent, origin='lower', aspect='auto',
+                    interpolation='nearest', cmap=cmap, norm=norm)
+    if clim is not None:
+        img.set_clim(clim)
+
+    # DOI fade mapped through the same raster, skipped if nothing fades
+    if doi_values is not None:
+        alphas = doi_alphas(*rect_bottom_height(rect), doi_values, doi_alpha)
+        if not np.all(alphas == 1.0):
+            img.set_alpha(raster_values(alphas, idx, weights).filled(1.0))
+
+    ax.set(title=title, xlim=xlim, ylim=ylim, xlabel=xlabel, ylabel=ylabel)
+    cb = fig.colorbar(img, ax=ax, label=colorbar_label)
+    if hide_xticks:
+        ax.get_xaxis().set_ticklabels([])
+    return img, cb
+
+
 def plot_slice_rect(fig, ax, rect, values, cmap='viridis', norm=None, title=None,
                     xlim=None, ylim=None,
                     xlabel=None, ylabel=None,
                     colorbar_label=None, hide_xticks=False, clim: tuple = None):
     ax.clear()
-    line_rects = PatchCollection(rect, cmap=cmap, norm=norm)
+    line_rects = rect_collection(rect, cmap=cmap, norm=norm)
     line_rects.set_array(values)
     if clim is not None:
         line_rects.set_clim(clim)
@@ -38,7 +230,7 @@ def plot_slice_rect_doi(fig, ax, rect, values, doi_values=None, doi_alpha=0.45,
     Parameters:
         fig: matplotlib figure object
         ax: matplotlib axis object
-        rect: collection of rectangles
+        rect: collection of rectangles, or (n, 4, 2) vertex array from df2polyverts
         values: values to color rectangles
         doi_values: array of DOI elevations, same length as `rect` (optional)
         doi_alpha: alpha value for rectangles below DOI
@@ -55,28 +247,19 @@ def plot_slice_rect_doi(fig, ax, rect, values, doi_values=None, doi_alpha=0.45,
     """
     ax.clear()
 
-    # Create PatchCollection for the rectangles
-    line_rects = PatchCollection(rect, cmap=cmap, norm=norm)
+    # Create collection for the rectangles
+    line_rects = rect_collection(rect, cmap=cmap, norm=norm)
     line_rects.set_array(values)
     if clim is not None:
         line_rects.set_clim(clim)
 
     # Adjust alpha for rectangles below DOI if DOI values are provided
     if doi_values is not None:
-        alphas = []
-        for rect_obj, doi in zip(rect, doi_values):
-            bottom = rect_obj.get_y()  # Bottom y-coordinate of the rectangle
-            top = bottom + rect_obj.get_height()  # Top y-coordinate of the rectangle
-            if top >= doi:  # Fully above DOI
-                alphas.append(1.0)
-            elif bottom <= doi:  # Fully below DOI
-                alphas.append(doi_alpha)
-            else:  # Partially intersecting DOI
-                alpha = doi_alpha + (1 - doi_alpha) * (doi - bottom) / rect_obj.get_height()
-                alphas.append(alpha)
-
-        # Set alpha values for the PatchCollection
-        line_rects.set_alpha(alphas)
+        bottom, height = rect_bottom_height(rect)
+        alphas = doi_alphas(bottom, height, doi_values, doi_alpha)
+        # Per-face alphas are applied to the mapped RGBA colors in one call (skipped if nothing fades)
+        if not np.all(alphas == 1.0):
+            line_rects.set_alpha(alphas)
 
     ax.add_collection(line_rects)
 
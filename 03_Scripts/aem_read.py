@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import re
+from pathlib import Path
 
 # -------------------------------------------------------------------------------------------------------------------- #
 
@@ -85,3 +86,154 @@ def aem_wide2long(df, id_col_prefixes, dist_col='LINE_DIST', line_col='Line'):
     return ldf
 
 # -------------------------------------------------------------------------------------------------------------------- #
+
+def _depth_key(depths, decimals=2):
+    """ Integer depth key (e.g., centimeters) so joins never rely on float equality. Missing depths get -1 """
+    depths = np.asarray(depths, dtype=float)
+    key = np.full(depths.shape, -1, dtype=np.int64)
+    valid = ~np.isnan(depths)
+    key[valid] = np.rint(depths[valid] * 10**decimals).astype(np.int64)
+    return key
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def read_texture_probs(filepath, cache=True):
+    """
+    Reads an AEM2Texture output file (e.g., AEM_TextureProbs.dat), splitting the Line column ("LINE_FID") into
+    integer LINE_NO and FID columns at read time. Rows that are not AEM soundings (e.g., well logs copied in via
+    prv_log_file) are dropped.
+
+    Parameters:
+        filepath: path to the AEM2Texture output file
+        cache: if True, parsed arrays are stored next to the file as a binary .npz and re-used until the source
+               file changes (size or modification time)
+    Returns:
+        DataFrame with columns LINE_NO, FID, ID, n, X, Y, Zland, Depth, followed by the texture classes
+    """
+    filepath = Path(filepath)
+    cache_file = filepath.with_suffix('.npz')
+    stat = filepath.stat()
+    stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    if cache and cache_file.exists():
+        with np.load(cache_file, allow_pickle=False) as npz:
+            if np.array_equal(npz['stamp'], stamp):
+                df = pd.DataFrame({'LINE_NO': npz['line_no'], 'FID': npz['fid'], 'ID': npz['id'], 'n': npz['n']})
+                df[['X', 'Y', 'Zland', 'Depth']] = npz['xyzd']
+                df[npz['classes'].tolist()] = npz['probs']
+                return df
+
+    raw = pd.read_csv(filepath, sep='\\s+', dtype={'Line': str})
+    tex_classes = raw.columns[7:].tolist()
+    line_fid = raw['Line'].str.partition('_')
+    raw = raw[line_fid[1] == '_']
+    line_fid = line_fid[line_fid[1] == '_']
+
+    df = pd.DataFrame({'LINE_NO': pd.to_numeric(line_fid[0]).to_numpy(np.int64),
+                       'FID': pd.to_numeric(line_fid[2]).to_numpy(np.int64),
+                       'ID': raw['ID'].to_numpy(np.int64),
+                       'n': raw['n'].to_numpy(np.int64)})
+    df[['X', 'Y', 'Zland', 'Depth']] = raw[['X', 'Y', 'Zland', 'Depth']].to_numpy(float)
+    df[tex_classes] = raw[tex_classes].to_numpy(float)
+
+    if cache:
+        np.savez(cache_file, stamp=stamp, line_no=df['LINE_NO'].to_numpy(), fid=df['FID'].to_numpy(),
+                 id=df['ID'].to_numpy(), n=df['n'].to_numpy(),
+                 xyzd=df[['X', 'Y', 'Zland', 'Depth']].to_numpy(), probs=df[tex_classes].to_numpy(),
+                 classes=np.array(tex_classes))
+    return df
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def align_texture_probs(df, tprobs, tex_classes, line_col='LINE_NO', fid_col='FID', depth_col='DEP_BOT',
+                        decimals=2):
+    """
+    Aligns texture probabilities from read_texture_probs() to the rows of a long AEM table (one row per pixel).
+    Pixels are matched on integer (LINE_NO, FID, depth key) positions, replacing a DataFrame.merge on float depths.
+
+    Parameters:
+        df: long AEM DataFrame (e.g., from aem_wide2long)
+        tprobs: DataFrame from read_texture_probs
+        tex_classes: texture class columns to align
+        line_col, fid_col, depth_col: columns of df holding the line, sounding ID, and pixel bottom depth
+        decimals: depth precision used to build the integer depth key
+    Returns:
+        DataFrame with the same index as df and one column per texture class (NaN where no match)
+    """
+    tkey = pd.MultiIndex.from_arrays([tprobs['LINE_NO'].to_numpy(np.int64),
+                                      tprobs['FID'].to_numpy(np.int64),
+                                      _depth_key(tprobs['Depth'], decimals)])
+    # Later (appended) rows win if a pixel is repeated
+    unique = ~tkey.duplicated(keep='last')
+    tkey = tkey[unique]
+    dkey = pd.MultiIndex.from_arrays([df[line_col].to_numpy(np.int64),
+                                      df[fid_col].to_numpy(np.int64),
+                                      _depth_key(df[depth_col], decimals)])
+    pos = tkey.get_indexer(dkey)
+    pos[dkey.get_level_values(2) < 0] = -1
+
+    probs = tprobs[tex_classes].to_numpy(float)[unique][pos]
+    probs[pos < 0] = np.nan
+    return pd.DataFrame(probs, index=df.index, columns=tex_classes)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def saturated_zone(dep_top, dep_bot, wt, criterion='top', elev=None):
+    """
+    Vectorized saturated-zone test for AEM pixels. Works on long-table columns or on (sounding, pixel) blocks of
+    the wide table (e.g. DEP_TOP_* columns as an array, with the water table as a (nsounding, 1) column).
+
+    Parameters:
+        dep_top, dep_bot: pixel top and bottom depths
+        wt: water table depth, or water table elevation when `elev` is given. Broadcast against the pixels.
+        criterion: 'top'    - saturated if the pixel top is at or below the water table (whole pixel saturated)
+                   'bottom' - saturated if the pixel bottom is at or below the water table (includes pixels the
+                              water table passes through)
+        elev: land surface elevation, to test pixel elevations against a water table elevation
+    Returns:
+        mask: boolean array, True for saturated pixels
+        sat_top: top depth of the saturated part of each pixel (top clipped to the water table), NaN if unsaturated
+        sat_frac: saturated fraction of each pixel's thickness (0-1)
+    """
+    if criterion not in ('top', 'bottom'):
+        raise ValueError(f'Unknown saturated zone criterion: {criterion}')
+    dep_top = np.asarray(dep_top, dtype=float)
+    dep_bot = np.asarray(dep_bot, dtype=float)
+    wt = np.asarray(wt, dtype=float)
+    if elev is None:
+        wt_depth = wt
+        top_below = dep_top >= wt
+        bot_below = dep_bot >= wt
+    else:
+        elev = np.asarray(elev, dtype=float)
+        wt_depth = elev - wt
+        top_below = (elev - dep_top) <= wt
+        bot_below = (elev - dep_bot) <= wt
+    mask = top_below if criterion == 'top' else bot_below
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        partial = np.clip((dep_bot - wt_depth) / (dep_bot - dep_top), 0, 1)
+    sat_frac = np.where(top_below, 1.0, np.where(bot_below, partial, 0.0))
+    sat_top = np.where(mask, np.maximum(dep_top, wt_depth), np.nan)
+    return mask, sat_top, sat_frac
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def flag_saturated(df, wt_col, criterion='top', elev_col=None, top_col='DEP_TOP', bot_col='DEP_BOT'):
+    """
+    Adds the saturated zone mask (see saturated_zone) to a long AEM table as column SAT. Computed once per run,
+    later steps reuse the column instead of re-testing against the water table.
+
+    Parameters:
+        df: long AEM DataFrame (one row per pixel)
+        wt_col: water table column, depth (or elevation when elev_col is given)
+        criterion: 'top' or 'bottom', see saturated_zone
+        elev_col: land surface elevation column, when wt_col is a water table elevation
+    Returns:
+        df, with the columns added in place
+    """
+    elev = df[elev_col] if elev_col is not None else None
+    df['SAT'] = saturated_zone(df[top_col], df[bot_col], df[wt_col], criterion, elev)[0]
+    return df
+
+# -------------------------------------------------------------------------------------------------------------------- #
@@ -0,0 +1,57 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Zone codes
+# -------------------------------------------------------------------------------------------------------------------- #
+
+INSIDE_DOMAIN = 0
+WITHIN_BUFFER = 1
+OUTSIDE_BUFFER = 2
+
+ZONE_NAMES = np.array(['Inside Domain', 'Within Buffer', 'Outside Buffer'], dtype=object)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+class DomainMask(object):
+    """
+    Classifies XY locations as inside the model domain, within a buffer around it, or outside the buffer.
+
+    The domain and buffer are each merged into one geometry and prepared once (shapely builds a spatial index over
+    their edges), so arrays of coordinates are tested in bulk with contains_xy without creating point objects.
+    Only points inside the buffer are tested against the domain.
+
+    Parameters:
+        domain: GeoDataFrame/GeoSeries of domain polygons
+        buffer_dist: buffer distance (map units), as in domain.buffer(buffer_dist)
+    """
+    def __init__(self, domain, buffer_dist):
+        self.buffer_shp = domain.buffer(buffer_dist)
+        self.domain = shapely.union_all(np.asarray(domain.geometry))
+        self.buffer = shapely.union_all(np.asarray(self.buffer_shp))
+        shapely.prepare(self.domain)
+        shapely.prepare(self.buffer)
+
+    def classify(self, x, y):
+        """ Returns int8 zone codes (INSIDE_DOMAIN, WITHIN_BUFFER, OUTSIDE_BUFFER) for arrays of coordinates """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        zones = np.full(x.shape, OUTSIDE_BUFFER, dtype=np.int8)
+        in_buffer = shapely.contains_xy(self.buffer, x, y)
+        zones[in_buffer] = WITHIN_BUFFER
+        in_domain = shapely.contains_xy(self.domain, x[in_buffer], y[in_buffer])
+        zones[np.flatnonzero(in_buffer)[in_domain]] = INSIDE_DOMAIN
+        return zones
+
+    def classify_points(self, points: gpd.GeoDataFrame):
+        """ Zone codes for a GeoDataFrame/GeoSeries of points """
+        return self.classify(points.geometry.x, points.geometry.y)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def zone_names(zones):
+    """ Zone names ('Inside Domain', 'Within Buffer', 'Outside Buffer') for an array of zone codes """
+    return ZONE_NAMES[np.asarray(zones)]
+
+# -------------------------------------------------------------------------------------------------------------------- #
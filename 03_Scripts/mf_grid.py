@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def cell_polygons(modelgrid):
+    """
+    Cell polygons of a structured flopy modelgrid, row-major (node order), built in one call from the grid's vertex
+    arrays. Vertices run upper-left, upper-right, lower-right, lower-left as in modelgrid.get_cell_vertices().
+    """
+    xv, yv = np.asarray(modelgrid.xvertices), np.asarray(modelgrid.yvertices)
+    corners = [(slice(None, -1), slice(None, -1)), (slice(None, -1), slice(1, None)),
+               (slice(1, None), slice(1, None)), (slice(1, None), slice(None, -1))]
+    coords = np.stack([np.column_stack([xv[r, c].ravel(), yv[r, c].ravel()]) for r, c in corners], axis=1)
+    return shapely.polygons(coords)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+class GridFrames(object):
+    """
+    Builds GeoDataFrames of a structured MODFLOW grid in memory, in place of writing and re-reading
+    flopy.export.shapefile_utils.write_grid_shapefile output. Cell polygons are built once and shared by every
+    layer; each layer only attaches its property columns.
+
+    Columns follow write_grid_shapefile: node, row, column (1-based), then one column per property array.
+
+    Parameters:
+        modelgrid: flopy StructuredGrid (with offsets/rotation already set)
+        crs: coordinate reference system of the grid
+    """
+    def __init__(self, modelgrid, crs=None):
+        self.nrow, self.ncol = modelgrid.nrow, modelgrid.ncol
+        self.crs = crs
+        self.geometry = cell_polygons(modelgrid)
+        ncell = self.nrow * self.ncol
+        self.cells = pd.DataFrame({'node': np.arange(1, ncell + 1),
+                                   'row': np.repeat(np.arange(1, self.nrow + 1), self.ncol),
+                                   'column': np.tile(np.arange(1, self.ncol + 1), self.nrow)})
+
+    def frame(self, array_dict, mask=None):
+        """
+        GeoDataFrame of one layer.
+
+        Parameters:
+            array_dict: {column name: (nrow, ncol) array}
+            mask: optional (nrow, ncol) boolean array of cells to keep (e.g. ibound != 0)
+        Returns:
+            GeoDataFrame with node, row, column, property columns and cell polygons
+        """
+        df = self.cells.copy()
+        for name, arr in array_dict.items():
+            df[name] = np.asarray(arr).ravel()
+        geometry = self.geometry
+        if mask is not None:
+            keep = np.asarray(mask, dtype=bool).ravel()
+            df, geometry = df[keep].reset_index(drop=True), geometry[keep]
+        return gpd.GeoDataFrame(df, geometry=geometry, crs=self.crs)
+
+# -------------------------------------------------------------------------------------------------------------------- #
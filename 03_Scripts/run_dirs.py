@@ -0,0 +1,147 @@
+import os
+import shutil
+from pathlib import Path
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Run directory set-up for batches of model runs (e.g. cross-validation folds)
+#   Immutable inputs (model folders, shared data files) are linked into each run directory instead of copied.
+#   Link modes, each falling back to the next when the filesystem refuses (other drive, no symlink privilege, ...):
+#     hardlink: same file under another name, no extra disk (same volume only)
+#     symlink:  pointer to the source path
+#     copy:     full copy (metadata preserved)
+#   Linked files share their content with the source: they must not be edited in place. Files a run rewrites are
+#   listed as `materialize` patterns and copied instead.
+# -------------------------------------------------------------------------------------------------------------------- #
+
+LINK_MODES = ('hardlink', 'symlink', 'copy')
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def _is_linked(src, dst, mode):
+    if not os.path.lexists(dst):
+        return False
+    if mode == 'symlink':
+        return os.path.islink(dst) and os.path.realpath(dst) == os.path.realpath(src)
+    if mode == 'hardlink':
+        return not os.path.islink(dst) and os.path.samefile(src, dst)
+    s, d = os.stat(src), os.stat(dst, follow_symlinks=False)
+    return s.st_size == d.st_size and s.st_mtime_ns == d.st_mtime_ns
+
+def link_file(src, dst, mode='hardlink'):
+    """
+    Makes file dst refer to src. A dst that already refers to src is left alone, anything else at dst is replaced.
+
+    Parameters:
+        src: source file
+        dst: destination path (parent directories are created)
+        mode: 'hardlink', 'symlink' or 'copy' (see LINK_MODES), falling back along that order
+    Returns:
+        mode actually used
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f'Unknown link mode: {mode} (expected one of {LINK_MODES})')
+    src, dst = os.path.abspath(src), os.path.abspath(dst)
+    for m in LINK_MODES[LINK_MODES.index(mode):]:
+        if _is_linked(src, dst, m):
+            return m
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.lexists(dst):
+            os.remove(dst)
+        try:
+            if m == 'hardlink':
+                os.link(src, dst)
+            elif m == 'symlink':
+                os.symlink(src, dst)
+            else:
+                shutil.copy2(src, dst)
+            return m
+        except OSError:
+            if m == 'copy':
+                raise
+    return mode
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def link_tree(src, dst, mode='hardlink', materialize=()):
+    """
+    Mirrors directory src at dst: directories are created, files are linked (link_file). Re-running is cheap, as
+    files that are already linked are skipped.
+
+    Parameters:
+        src: source directory
+        dst: destination directory
+        mode: link mode for the files (see LINK_MODES)
+        materialize: glob patterns (matched against the path relative to src, e.g. '*.upw') of files to copy
+                     rather than link, for files a run modifies
+    Returns:
+        number of files per mode used, e.g. {'hardlink': 85, 'copy': 1}
+    """
+    src, dst = Path(src), Path(dst)
+    used = {}
+    for root, _, files in os.walk(src):
+        rel = Path(root).relative_to(src)
+        (dst / rel).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            m = 'copy' if any((rel / name).match(p) for p in materialize) else mode
+            m = link_file(Path(root) / name, dst / rel / name, m)
+            used[m] = used.get(m, 0) + 1
+    return used
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def write_if_changed(path, text):
+    """ Writes a (small) per-run text file, leaving it untouched when the content is already the same """
+    path = Path(path)
+    if path.is_file() and not path.is_symlink() and os.stat(path).st_nlink == 1:
+        if path.read_text() == text:
+            return False
+    elif os.path.lexists(path):
+        os.remove(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text)
+    os.replace(tmp, path)
+    return True
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def build_run_dir(run_dir, files=None, links=None, trees=None, mode='hardlink', materialize=()):
+    """
+    Sets up one run directory.
+
+    Parameters:
+        run_dir: run directory (created)
+        files: {relative path: text} of per-run files, written into the run directory
+        links: {relative path: source file} of shared files, linked into the run directory
+        trees: {relative path: source directory} of shared folders, mirrored with link_tree. Paths may point outside
+               the run directory (e.g. '../MODFLOW') so that one linked model folder serves several runs.
+        mode: link mode (see LINK_MODES)
+        materialize: patterns of tree files to copy instead of link (see link_tree)
+    Returns:
+        run_dir (Path)
+    """
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    for rel, text in (files or {}).items():
+        write_if_changed(run_dir / rel, text)
+    for rel, src in (links or {}).items():
+        link_file(src, run_dir / rel, mode)
+    for rel, src in (trees or {}).items():
+        link_tree(src, run_dir / rel, mode, materialize)
+    return run_dir
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def replace_file(path, write):
+    """
+    Regenerates a shared input through a temporary file and os.replace, so the new content gets a new file and
+    runs still hard-linked to the previous version keep it. `write` is called with the temporary path.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+    return path
+
+# -------------------------------------------------------------------------------------------------------------------- #
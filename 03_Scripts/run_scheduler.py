@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+from pathlib import Path
+import pandas as pd
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Scheduler for batches of external model runs (Texture2Par, MODFLOW, ...)
+#   - workers sized from the available cores and memory (default_workers)
+#   - each run's stdout/stderr go to <name>.stdout.log / <name>.stderr.log in its log directory (retries append,
+#     one header per attempt)
+#   - a run's expected outputs are deleted before it starts, so leftovers from earlier runs never count
+#   - a finished run writes a sentinel (<name>.done.json) holding its key (command, inputs' content); on the next
+#     call runs with a matching sentinel are skipped, so an interrupted batch resumes where it stopped
+#   - per-run timeouts (the process is killed) and retries
+# Any executable works, e.g. a Python stand-in script ([sys.executable, 'fake_t2p.py', 'svihm.t2p']) for testing
+# batches away from Windows.
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def available_cores():
+    """ Cores this process may run on """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def available_memory():
+    """ Available physical memory in bytes (None if unknown) """
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        stat = MemoryStatus()
+        stat.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+            return stat.ullAvailPhys
+        return None
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def default_workers(mem_per_job=None, reserve_cores=1, max_workers=None):
+    """
+    Number of concurrent runs: available cores (less reserve_cores), limited by available memory / mem_per_job
+    (bytes) and by max_workers. At least 1.
+    """
+    n = available_cores() - reserve_cores
+    mem = available_memory()
+    if mem_per_job and mem is not None:
+        n = min(n, int(mem // mem_per_job))
+    if max_workers is not None:
+        n = min(n, max_workers)
+    return max(n, 1)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+class Job(object):
+    """
+    One external run.
+
+    Parameters:
+        name: unique run name (sentinel and log file names)
+        cmd: command line (list of arguments)
+        cwd: working directory
+        inputs: optional files whose content is part of the run's key, so changed inputs invalidate the sentinel
+        outputs: optional files (relative to cwd) that must exist for the run to count as finished. They are
+                 deleted before each attempt.
+        timeout: seconds before the run is killed (None = scheduler default)
+        log_dir: directory for the sentinel and logs (default: cwd)
+    """
+    def __init__(self, name, cmd, cwd='.', inputs=(), outputs=(), timeout=None, log_dir=None):
+        self.name = str(name)
+        self.cmd = [str(c) for c in cmd]
+        self.cwd = Path(cwd)
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = list(outputs)
+        self.timeout = timeout
+        self.log_dir = Path(log_dir) if log_dir is not None else self.cwd
+
+    @property
+    def sentinel(self):
+        return self.log_dir / f'{self.name}.done.json'
+
+    def log_files(self):
+        return self.log_dir / f'{self.name}.stdout.log', self.log_dir / f'{self.name}.stderr.log'
+
+    def key(self):
+        """ Hash of the command and the content of the inputs """
+        h = hashlib.sha1(json.dumps([self.cmd, str(self.cwd.resolve())]).encode())
+        for path in self.inputs:
+            h.update(str(path).encode())
+            with open(self.cwd / path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+        return h.hexdigest()
+
+    def is_done(self, key=None):
+        """ True when the sentinel exists, matches the current key and the outputs exist """
+        if not self.sentinel.exists():
+            return False
+        try:
+            stored = json.loads(self.sentinel.read_text())
+        except ValueError:
+            return False
+        return (stored.get('key') == (key or self.key()) and
+                all((self.cwd / out).exists() for out in self.outputs))
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+class JobScheduler(object):
+    """
+    Runs Jobs as concurrent subprocesses, at most `workers` at a time.
+
+    Parameters:
+        workers: concurrent runs (default: default_workers(mem_per_job))
+        mem_per_job: expected peak memory of one run in bytes, to size the default workers
+        timeout: default per-run timeout in seconds (None = no limit)
+        retries: extra attempts for failed or timed out runs
+        poll: seconds between checks of the running processes
+        verbose: print a line per started/finished run
+    """
+    def __init__(self, workers=None, mem_per_job=None, timeout=None, retries=0, poll=0.5, verbose=True):
+        self.workers = workers or default_workers(mem_per_job)
+        self.timeout = timeout
+        self.retries = retries
+        self.poll = poll
+        self.verbose = verbose
+
+    def _print(self, msg):
+        if self.verbose:
+            print(msg, flush=True)
+
+    def _start(self, job, attempt):
+        job.log_dir.mkdir(parents=True, exist_ok=True)
+        if job.sentinel.exists():
+            job.sentinel.unlink()
+        #-- Outputs of an earlier run must not make this one look finished
+        for out in job.outputs:
+            if os.path.lexists(job.cwd / out):
+                os.remove(job.cwd / out)
+
+        #-- Retries append to the logs of the failed attempts, each attempt under its own header
+        out_log, err_log = job.log_files()
+        mode = 'w' if attempt == 1 else 'a'
+        header = f'==== {job.name}: attempt {attempt}, started {time.strftime("%Y-%m-%d %H:%M:%S")} ====\n'
+        with open(out_log, mode) as out, open(err_log, mode) as err:
+            out.write(header)
+            err.write(header)
+            out.flush()
+            err.flush()
+            proc = subprocess.Popen(job.cmd, cwd=job.cwd, stdout=out, stderr=err, stdin=subprocess.DEVNULL)
+        self._print(f' - STARTED:  {job.name}' + (f' (attempt {attempt})' if attempt > 1 else ''))
+        return proc
+
+    def run(self, jobs, resume=True):
+        """
+        Runs the jobs, skipping those already finished (resume=True).
+
+        Returns:
+            DataFrame with one row per job: name, status ('done', 'skipped', 'failed', 'timeout'), returncode,
+            seconds, attempts
+        """
+        jobs = list(jobs)
+        names = [job.name for job in jobs]
+        if len(set(names)) != len(names):
+            raise ValueError('Job names must be unique')
+
+        status = {}
+        pending = []
+        for job in jobs:
+            key = job.key()
+            if resume and job.is_done(key):
+                status[job.name] = {'status': 'skipped', 'returncode': 0, 'seconds': 0.0, 'attempts': 0}
+            else:
+                pending.append((job, key, 1))
+        if len(status) > 0:
+            self._print(f'Skipping {len(status)} finished runs')
+
+        running = []
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    job, key, attempt = pending.pop(0)
+                    running.append((job, key, attempt, self._start(job, attempt), time.monotonic()))
+                time.sleep(self.poll if running else 0)
+                still_running = []
+                for job, key, attempt, proc, t0 in running:
+                    elapsed = time.monotonic() - t0
+                    timeout = job.timeout if job.timeout is not None else self.timeout
+                    rc = proc.poll()
+                    if rc is None and timeout is not None and elapsed > timeout:
+                        proc.kill()
+                        proc.wait()
+                        rc, result = proc.returncode, 'timeout'
+                    elif rc is None:
+                        still_running.append((job, key, attempt, proc, t0))
+                        continue
+                    else:
+                        outputs_ok = all((job.cwd / out).exists() for out in job.outputs)
+                        result = 'done' if rc == 0 and outputs_ok else 'failed'
+                    if result == 'done':
+                        tmp = job.sentinel.with_name(job.sentinel.name + '.tmp')
+                        tmp.write_text(json.dumps({'key': key, 'cmd': job.cmd, 'returncode': rc,
+                                                   'seconds': round(elapsed, 3), 'attempts': attempt,
+                                                   'finished': time.strftime('%Y-%m-%d %H:%M:%S')}, indent=1))
+                        os.replace(tmp, job.sentinel)
+                    elif attempt <= self.retries:
+                        pending.append((job, key, attempt + 1))
+                    self._print(f' - {result.upper() + ":":9s} {job.name} ({elapsed:.1f} s)')
+                    status[job.name] = {'status': result, 'returncode': rc, 'seconds': elapsed, 'attempts': attempt}
+                running = still_running
+        finally:
+            #-- Interrupted: stop the remaining runs, they have no sentinel and will be rerun on resume
+            for job, _, _, proc, _ in running:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+        table = pd.DataFrame([dict(name=name, **status[name]) for name in names])
+        counts = table['status'].value_counts()
+        self._print('Runs: ' + ', '.join(f'{n} {s}' for s, n in counts.items()))
+        return table
+
+# -------------------------------------------------------------------------------------------------------------------- #
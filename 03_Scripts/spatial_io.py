@@ -0,0 +1,90 @@
+from pathlib import Path
+import geopandas as gpd
+try:
+    import pyarrow  # noqa: F401 (GeoParquet and pyogrio's Arrow I/O)
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Spatial export targets
+#   parquet: GeoParquet, columnar and fast to read back (read_spatial's cache). Needs pyarrow: without it,
+#            'parquet' falls back to 'gpkg' and pyogrio reads/writes feature by feature
+#   gpkg:    GeoPackage, a single file that can hold many layers (no 10 character field name limit)
+#   shp:     ESRI Shapefile, for tools that still need it
+# -------------------------------------------------------------------------------------------------------------------- #
+
+EXPORT_SUFFIXES = {'parquet': '.parquet', 'gpkg': '.gpkg', 'shp': '.shp'}
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def write_spatial(gdf, path, formats=('parquet', 'gpkg'), gpkg=None, layer=None, row_group_size=100000):
+    """
+    Writes a GeoDataFrame to one or more formats. GeoParquet is written in row groups with a bbox column (so reads
+    can skip row groups outside a bbox), GeoPackage and Shapefile through pyogrio with Arrow (columnar batches
+    instead of feature by feature).
+
+    Parameters:
+        gdf: GeoDataFrame
+        path: output path; its suffix is replaced by each format's suffix
+        formats: any of 'parquet', 'gpkg', 'shp' ('parquet' becomes 'gpkg' without pyarrow)
+        gpkg: GeoPackage file to write into (default: path with .gpkg). Several outputs can share one GeoPackage
+              as separate layers.
+        layer: GeoPackage layer name (default: path stem). An existing layer of the same name is replaced.
+        row_group_size: rows per GeoParquet row group
+    Returns:
+        list of written files
+    """
+    path = Path(path)
+    if 'parquet' in formats and not HAS_ARROW:
+        print('pyarrow is not installed, writing GeoPackage instead of GeoParquet')
+        formats = [f for f in formats if f != 'parquet'] + ([] if 'gpkg' in formats else ['gpkg'])
+    written = []
+    for fmt in formats:
+        if fmt not in EXPORT_SUFFIXES:
+            raise ValueError(f'Unknown spatial export format: {fmt} (expected one of {list(EXPORT_SUFFIXES)})')
+        if fmt == 'parquet':
+            out = path.with_suffix('.parquet')
+            gdf.to_parquet(out, index=False, row_group_size=row_group_size, write_covering_bbox=True)
+        elif fmt == 'gpkg':
+            out = Path(gpkg) if gpkg is not None else path.with_suffix('.gpkg')
+            gdf.to_file(out, driver='GPKG', layer=layer or path.stem, engine='pyogrio', use_arrow=HAS_ARROW)
+        else:
+            out = path.with_suffix('.shp')
+            gdf.to_file(out, driver='ESRI Shapefile', engine='pyogrio', use_arrow=HAS_ARROW)
+        written.append(out)
+    return written
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def read_spatial(path, columns=None, bbox=None, layer=None, cache=False):
+    """
+    Reads a spatial file, the path as given unless cache=True.
+
+    Parameters:
+        path: .parquet, .gpkg, .shp (or any file GDAL reads)
+        columns: optional list of attribute columns to read
+        bbox: optional (minx, miny, maxx, maxy) filter
+        layer: GeoPackage layer (default: first layer)
+        cache: opt-in GeoParquet copy for a source that is read often (e.g. grid.shp -> grid.parquet, same folder
+               and stem). If the copy is at least as new as the source it is read instead of the source; otherwise
+               the whole source is read once and written as the copy (write_spatial). Ignored without pyarrow.
+    Returns:
+        GeoDataFrame
+    """
+    path = Path(path)
+    pq = path.with_suffix('.parquet')
+    if cache and HAS_ARROW and path.suffix != '.parquet':
+        if pq.exists() and (not path.exists() or pq.stat().st_mtime >= path.stat().st_mtime):
+            path = pq
+        else:
+            gdf = gpd.read_file(path, layer=layer, engine='pyogrio', use_arrow=HAS_ARROW)
+            write_spatial(gdf, pq, ['parquet'])
+            path = pq
+    if path.suffix == '.parquet':
+        if columns is not None:
+            columns = list(columns) + ['geometry']
+        return gpd.read_parquet(path, columns=columns, bbox=bbox)
+    return gpd.read_file(path, columns=columns, bbox=bbox, layer=layer, engine='pyogrio', use_arrow=HAS_ARROW)
+
+# -------------------------------------------------------------------------------------------------------------------- #
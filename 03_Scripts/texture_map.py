@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Driller texture mapping, shared by 01 (clustering) and 04 (texture logs)
+#   ModelClass:     texture class written to the T2P texture logs (None = no data, -999 in the log)
+#   Classification: forced fine/coarse classification for clustering (None = keep the CSV Classification)
+#   Cluster:        whether intervals with this texture are used to fit the clusters
+# -------------------------------------------------------------------------------------------------------------------- #
+
+TEXTURE_TABLE = pd.DataFrame.from_records([
+    # Texture      ModelClass      Classification  Cluster
+    ('shale',      'Fine',         'fine',         True),
+    ('claystone',  'Fine',         None,           True),
+    ('clay',       'Mixed_Fine',   None,           True),
+    ('silt',       'Mixed_Fine',   None,           True),
+    ('loam',       'Mixed_Fine',   None,           True),
+    ('top soil',   'Mixed_Fine',   'fine',         False),
+    ('sand',       'Sand',         None,           True),
+    ('gravel',     'Mixed_Coarse', None,           True),
+    ('cobbles',    'Mixed_Coarse', None,           False),
+    ('boulders',   'Very_Coarse',  None,           True),
+    ('sandstone',  'Very_Coarse',  None,           True),
+    ('lava',       'Very_Coarse',  None,           True),
+    ('lime',       'Very_Coarse',  None,           True),
+    ('rock',       'Very_Coarse',  None,           False),
+    ('unknown',    None,           None,           False),
+], columns=['Texture', 'ModelClass', 'Classification', 'Cluster']).set_index('Texture')
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def texture_codes(textures, table=TEXTURE_TABLE):
+    """ Row of each texture in the table as one categorical lookup, -1 for textures not in the table """
+    return pd.Categorical(np.asarray(textures, dtype=object), categories=table.index).codes
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def map_textures(textures, column, table=TEXTURE_TABLE, default=None):
+    """
+    Vectorized table lookup of driller textures.
+
+    Parameters:
+        textures: Series (or array) of driller textures
+        column: table column to return (ModelClass, Classification, Cluster)
+        table: texture table, indexed by texture
+        default: value for textures not in the table, either a scalar or an array/Series aligned with textures
+                 (e.g. the textures themselves to leave them unchanged)
+    Returns:
+        Series of looked up values, with the index of `textures` (if a Series)
+    """
+    codes = texture_codes(textures, table)
+    values = table[column].to_numpy(dtype=object)[np.clip(codes, 0, None)]
+    if default is None or np.isscalar(default):
+        default = np.full(len(codes), default, dtype=object)
+    values = np.where(codes >= 0, values, np.asarray(default, dtype=object))
+    index = textures.index if isinstance(textures, pd.Series) else None
+    values = pd.Series(values, index=index, name=column)
+    if column == 'Cluster':
+        values = values.astype(bool)
+    return values
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def report_unknown_textures(textures, table=TEXTURE_TABLE, label='Textures'):
+    """ Prints one summary of textures that are not in the table, returns their counts """
+    codes = texture_codes(textures, table)
+    unknown = pd.Series(np.asarray(textures, dtype=object)[codes < 0]).value_counts(dropna=False)
+    if len(unknown) > 0:
+        print(f'{label} not in texture table ({unknown.sum()} intervals):')
+        for tex, n in unknown.items():
+            print(f'  {tex}: {n}')
+    return unknown
+
+# -------------------------------------------------------------------------------------------------------------------- #
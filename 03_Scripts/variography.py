@@ -0,0 +1,652 @@
+import os
+import copy
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import gstools as gs
+from scipy.spatial import cKDTree
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Variography sequence, run for each texture:
+#   isotropic:  exploratory omnidirectional variogram (isotropic_model)
+#   scan:       optional principal direction scan over azimuths (PairIndex + direction_scan), as
+#               {'angles': (start, stop, step), 'angle_tol', 'bin_edges', 'sampling_size'}
+#   horizontal: principal horizontal direction -> horizontal range ('principal' = the scan's longest range).
+#               Estimated from a PairIndex (see horizontal_pairs), so the well bootstrap can re-weight the same
+#               pairs: {'direction', 'angles_tol' (radians, default pi/8), 'bin_edges', 'sampling_size'}
+#   vertical:   vertical direction -> vertical range, vertical anisotropy = range_z / range_max
+#               ('estimator': 'logs' = exact within-log pairs, see vertical_variogram)
+#   final:      anisotropic model fitted to the horizontal bins
+#   explore:    extra empirical variograms for plotting only ({label: step}), e.g. along X and Y
+# Other steps' dicts are passed to gs.vario_estimate (bin_edges as (start, stop, num) for np.linspace)
+# -------------------------------------------------------------------------------------------------------------------- #
+
+DEFAULT_CONFIG = {
+    'model': 'Exponential',
+    'isotropic_model': 'Spherical',
+    'seed': None,
+    'scan': None,
+    'isotropic': {'sampling_size': 1000},
+    'horizontal': {'direction': [1, 1, 0], 'sampling_size': 10000},
+    'vertical': {'estimator': 'logs', 'bin_edges': (0, 600, 50)},
+    'anis_xy': 1.0,
+    'explore': {'X-Direction': {'direction': [1, 0, 0], 'sampling_size': 5000},
+                'Y-Direction': {'direction': [0, 1, 0], 'sampling_size': 5000},
+                'Z-Direction (Fine Binning)': {'direction': [0, 0, 1], 'sampling_size': 10000,
+                                               'bin_edges': (0, 800, 35)}},
+}
+
+# Texture2Par variogram type names
+T2P_VTYPES = {'Exponential': 'Exp', 'Spherical': 'Sph', 'Gaussian': 'Gau'}
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def texture_config(tex, defaults=DEFAULT_CONFIG, overrides=None):
+    """ Variography config of one texture: defaults updated (per step) by overrides.get(tex) """
+    config = copy.deepcopy(defaults)
+    for key, value in ((overrides or {}).get(tex) or {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def read_logxyz(data_dir, textures, value_col='Layer1', file_fmt='t2p_{}_logxyz.csv'):
+    """
+    Reads each texture's Texture2Par log point file (X, Y, Z, value) once.
+
+    Returns:
+        {texture: (pos, values)} with pos a (3, n) array, no-data rows dropped
+    """
+    data = {}
+    for tex in textures:
+        df = pd.read_csv(Path(data_dir) / file_fmt.format(tex), na_values=-999)
+        df = df[['X', 'Y', 'Z', value_col]].dropna()
+        data[tex] = (df[['X', 'Y', 'Z']].to_numpy(float).T, df[value_col].to_numpy(float))
+    return data
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def log_ids(pos):
+    """ Log id (0 .. nlogs-1) per point: points sharing X, Y belong to one log """
+    return np.unique(np.asarray(pos)[:2].T, axis=0, return_inverse=True)[1].ravel()
+
+def vertical_log_sums(pos, values, bin_edges, well=None):
+    """
+    Per-log sums for the exact vertical variogram (see vertical_variogram).
+
+    Returns:
+        sums, counts: (nbins, nlogs) sums of squared differences and pair counts, logs in order of their ids
+    """
+    pos = np.asarray(pos, dtype=float)
+    v = np.asarray(values, dtype=float)
+    edges = np.asarray(bin_edges, dtype=float)
+    well = np.unique(np.asarray(log_ids(pos) if well is None else well), return_inverse=True)[1].ravel()
+    nw = well.max() + 1 if len(well) > 0 else 0
+
+    #-- Logs stacked along one axis, each offset past the previous one by more than the largest lag
+    z = pos[2]
+    span = (z.max() - z.min()) + edges[-1] + 1.0 if len(z) > 0 else 1.0
+    zs = z - z.min() + well * span
+    order = np.argsort(zs, kind='stable')
+    zs, v, well = zs[order], v[order], well[order]
+    p1 = np.r_[0.0, np.cumsum(v)]
+    p2 = np.r_[0.0, np.cumsum(v * v)]
+    start = np.arange(1, len(v) + 1)
+
+    #-- Sum of squared differences and pair counts over partners j > i with dz < e, for every edge e
+    sums, counts = np.zeros((len(edges), nw)), np.zeros((len(edges), nw))
+    for k, e in enumerate(edges):
+        stop = np.maximum(np.searchsorted(zs, zs + e, side='left'), start)
+        n = stop - start
+        sums[k] = np.bincount(well, weights=n * v * v + (p2[stop] - p2[start]) - 2.0 * v * (p1[stop] - p1[start]),
+                              minlength=nw)
+        counts[k] = np.bincount(well, weights=n, minlength=nw)
+    return np.diff(sums, axis=0), np.diff(counts, axis=0)
+
+def vertical_variogram(pos, values, bin_edges, well=None, weights=None):
+    """
+    Exact vertical variogram from within-log pairs, without sampling. Points of each log (same X, Y, or the same
+    `well` id) are sorted by depth; for every point the partners below it within a lag are a contiguous run, so
+    per-bin sums of (v_i - v_j)^2 = v_i^2 + v_j^2 - 2 v_i v_j come from prefix sums of v and v^2 and a
+    searchsorted per bin edge. All logs are handled in one vectorized pass (O(n log n) per bin edge).
+
+    Parameters:
+        pos: (3, n) array of X, Y, Z
+        values: values at pos
+        bin_edges: vertical lag bin edges
+        well: optional log id per point (default: unique X, Y)
+        weights: optional weight per log (e.g. bootstrap multiplicities), in order of the log ids
+    Returns:
+        bin_center, gamma (NaN for empty bins), counts
+    """
+    edges = np.asarray(bin_edges, dtype=float)
+    sums, counts = vertical_log_sums(pos, values, edges, well)
+    if weights is None:
+        sums, counts = sums.sum(axis=1), np.rint(counts.sum(axis=1)).astype(np.int64)
+    else:
+        sums, counts = sums @ weights, counts @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gamma = np.where(counts > 0, sums / (2.0 * counts), np.nan)
+    return (edges[:-1] + edges[1:]) / 2, gamma, counts
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def _estimate(pos, values, step, seed):
+    kwargs = dict(step)
+    estimator = kwargs.pop('estimator', 'sampled')
+    if kwargs.get('bin_edges') is not None:
+        kwargs['bin_edges'] = np.linspace(*kwargs['bin_edges'])
+    if estimator == 'logs':
+        return vertical_variogram(pos, values, kwargs['bin_edges'])[:2]
+    return gs.vario_estimate(pos, values, sampling_seed=seed, **kwargs)
+
+def _fit(model_name, bin_center, gamma, **kwargs):
+    model = getattr(gs, model_name)(dim=3, var=1.0, nugget=0.0, **kwargs)
+    ok = np.isfinite(gamma)
+    fit = model.fit_variogram(np.asarray(bin_center)[ok], np.asarray(gamma)[ok], nugget=True, return_r2=True)
+    return model, fit[2]
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def horizontal_direction(step, principal_angle=None):
+    """ Direction vector of the horizontal step ('principal' = azimuth principal_angle in degrees) """
+    direction = step.get('direction', [1, 0, 0])
+    if isinstance(direction, str):
+        if principal_angle is None:
+            raise ValueError("horizontal direction 'principal' needs a 'scan' step in the config")
+        direction = [np.cos(np.radians(principal_angle)), np.sin(np.radians(principal_angle)), 0]
+    return direction
+
+def horizontal_pairs(pos, values, step, seed=None, principal_angle=None, index=None):
+    """
+    Pairs of the horizontal step: a gs.vario_estimate style cone (angles_tol around the direction, radians) on a
+    PairIndex of a sampling_size point sample, binned on bin_edges (default gs.standard_bins of all points).
+
+    Parameters:
+        pos, values: as fit_texture
+        step: horizontal step dict
+        seed: sampling seed
+        principal_angle: azimuth for direction 'principal'
+        index: optional PairIndex to re-use (e.g. the scan's), if it has the same sample and reaches the last edge
+    Returns:
+        index (PairIndex), pairs (indices of the kept pairs), lag_bin (bin of each kept pair), bin_edges
+    """
+    edges = (np.linspace(*step['bin_edges']) if step.get('bin_edges') is not None else
+             np.asarray(gs.standard_bins(pos, dim=3)))
+    n = np.asarray(pos).shape[1]
+    sampling_size = step.get('sampling_size')
+    same_sample = index is not None and (
+        len(index.sample) == n if sampling_size is None or sampling_size >= n else
+        index.sampling == (sampling_size, seed))
+    if not same_sample or index.max_lag < edges[-1]:
+        index = PairIndex(pos, values, max_lag=edges[-1], sampling_size=sampling_size, seed=seed)
+    lag_bin = np.searchsorted(edges, index.distance(), side='right') - 1
+    keep = (index.cone(horizontal_direction(step, principal_angle), np.degrees(step.get('angles_tol', np.pi / 8))) &
+            (lag_bin >= 0) & (lag_bin < len(edges) - 1))
+    pairs = np.flatnonzero(keep)
+    return index, pairs, lag_bin[pairs], edges
+
+def binned_gamma(lag_bin, sq, bin_edges):
+    """ bin_center, Matheron semivariance per lag bin (NaN for empty bins) from per-pair semivariances """
+    nb = len(bin_edges) - 1
+    counts = np.bincount(lag_bin, minlength=nb)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gamma = np.where(counts > 0, np.bincount(lag_bin, weights=sq, minlength=nb) / counts, np.nan)
+    return (bin_edges[:-1] + bin_edges[1:]) / 2, gamma
+
+def _fit_final(model, anis_xy, horizontal, vertical):
+    """ Horizontal, vertical and anisotropic fits from (bin_center, gamma) of each """
+    model_max, r2_max = _fit(model, *horizontal)
+    model_z, r2_z = _fit(model, *vertical)
+    anis_z = model_z.len_scale / model_max.len_scale
+    model_aniso, r2_aniso = _fit(model, *horizontal, anis=[anis_xy, anis_z], angles=[0, 0, 0])
+    return model_aniso, anis_z, r2_max, r2_z, r2_aniso
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def _scan_index(pos, values, config):
+    if not config.get('scan'):
+        return None
+    max_lag = np.linspace(*config['scan']['bin_edges'])[-1]
+    return PairIndex(pos, values, max_lag=max_lag, sampling_size=config['scan'].get('sampling_size'),
+                     seed=config.get('seed'))
+
+def fit_texture(tex, pos, values, config=DEFAULT_CONFIG):
+    """
+    Runs the full variography sequence for one texture.
+
+    Parameters:
+        tex: texture name
+        pos: (3, n) array of X, Y, Z
+        values: texture values at pos
+        config: see DEFAULT_CONFIG / texture_config
+    Returns:
+        dict of fitted parameters (nugget, sill, range_max, range_min, range_z, anisotropies, R²) plus the
+        empirical variograms of each step under 'empirical' ({step: (bin_center, gamma)}) and of the explore
+        steps under 'explore' ({label: (bin_center, gamma)}), and the direction scan table under 'scan'
+    """
+    seed = config.get('seed')
+
+    #-- Principal direction: range of the directional variogram at each azimuth, from one pair index
+    scan, principal, index = None, None, _scan_index(pos, values, config)
+    if index is not None:
+        edges = np.linspace(*config['scan']['bin_edges'])
+        scan = direction_scan(index, np.arange(*config['scan']['angles']), edges, config['model'],
+                              config['scan'].get('angle_tol', 22.5))
+        principal = float(scan.loc[scan['range'].idxmax(), 'angle'])
+
+    #-- Horizontal from the pair index (the one the bootstrap re-weights), other steps through _estimate
+    index, pairs, lag_bin, edges = horizontal_pairs(pos, values, config['horizontal'], seed, principal, index)
+    empirical = {'isotropic': _estimate(pos, values, config['isotropic'], seed),
+                 'horizontal': binned_gamma(lag_bin, index.sq[pairs], edges),
+                 'vertical': _estimate(pos, values, config['vertical'], seed)}
+    explore = {label: _estimate(pos, values, step, seed) for label, step in (config.get('explore') or {}).items()}
+
+    model_iso, r2_iso = _fit(config['isotropic_model'], *empirical['isotropic'])
+    anis_xy = config['anis_xy']
+    model_aniso, anis_z, r2_max, r2_z, r2_aniso = _fit_final(config['model'], anis_xy, empirical['horizontal'],
+                                                             empirical['vertical'])
+
+    return {'texture': tex,
+            'model': config['model'],
+            'n_points': len(values),
+            'nugget': model_aniso.nugget,
+            'sill': model_aniso.var,
+            'range_max': model_aniso.len_scale,
+            'range_min': model_aniso.len_scale * anis_xy,
+            'range_z': model_aniso.len_scale * anis_z,
+            'anis_xy': anis_xy,
+            'anis_z': anis_z,
+            'range_iso': model_iso.len_scale,
+            'r2_iso': r2_iso,
+            'r2_max': r2_max,
+            'r2_z': r2_z,
+            'r2_aniso': r2_aniso,
+            'principal_angle': principal,
+            'empirical': empirical,
+            'explore': explore,
+            'scan': scan}
+
+def _fit_texture_job(args):
+    return fit_texture(*args)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def fit_textures(data, configs, processes=None):
+    """
+    Runs fit_texture for every texture in a process pool (one texture per task).
+
+    Parameters:
+        data: {texture: (pos, values)}, e.g. from read_logxyz
+        configs: {texture: config}
+        processes: worker processes (default: one per texture, at most all cores). 1 runs in this process.
+    Returns:
+        list of fit_texture results, in the order of data
+    """
+    jobs = [(tex, pos, values, configs[tex]) for tex, (pos, values) in data.items()]
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        return [_fit_texture_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_fit_texture_job, jobs))
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+class PairIndex(object):
+    """
+    All point pairs within max_lag, found once with a KD-tree, for binning directional variograms of any set of
+    directions, tolerances and lag bins without re-pairing the points (see directional()).
+
+    Pair point indices are stored as int32 and lag vectors as float32. Pairs are unordered, so each lag vector is
+    oriented to an azimuth in [0, 180). Azimuths are degrees counterclockwise from +X (direction [cos, sin, 0]),
+    dips are degrees up from horizontal.
+
+    Parameters:
+        pos: (3, n) array of X, Y, Z
+        values: values at pos (optional, see set_values)
+        max_lag: largest lag distance kept
+        sampling_size: optional random subset of points to pair (as gs.vario_estimate)
+        seed: random seed for the subset
+    """
+    def __init__(self, pos, values=None, max_lag=1000.0, sampling_size=None, seed=None):
+        pos = np.asarray(pos, dtype=float)
+        self.n = pos.shape[1]
+        self.sample = np.arange(self.n)
+        self.sampling = None
+        if sampling_size is not None and sampling_size < self.n:
+            self.sample = np.sort(np.random.default_rng(seed).choice(self.n, sampling_size, replace=False))
+            self.sampling = (sampling_size, seed)
+        xyz = pos[:, self.sample].T
+        pairs = cKDTree(xyz).query_pairs(max_lag, output_type='ndarray')
+        lag = xyz[pairs[:, 1]] - xyz[pairs[:, 0]]
+        flip = (lag[:, 1] < 0) | ((lag[:, 1] == 0) & ((lag[:, 0] < 0) | ((lag[:, 0] == 0) & (lag[:, 2] < 0))))
+        lag[flip] *= -1
+        self.i = np.where(flip, pairs[:, 1], pairs[:, 0]).astype(np.int32)
+        self.j = np.where(flip, pairs[:, 0], pairs[:, 1]).astype(np.int32)
+        self.lag = lag.astype(np.float32)
+        self.max_lag = max_lag
+        self.sq = None
+        if values is not None:
+            self.set_values(values)
+
+    def __len__(self):
+        return len(self.i)
+
+    def set_values(self, values):
+        """ Sets the field (values at all n points): stores each pair's semivariance 0.5 * (v_i - v_j)^2 """
+        v = np.asarray(values, dtype=float)[self.sample]
+        self.sq = (0.5 * (v[self.i] - v[self.j]) ** 2).astype(np.float32)
+
+    def distance(self):
+        return np.sqrt((self.lag.astype(float) ** 2).sum(axis=1))
+
+    def azimuth(self):
+        return np.degrees(np.arctan2(self.lag[:, 1], self.lag[:, 0])) % 180.0
+
+    def dip(self):
+        return np.degrees(np.arctan2(self.lag[:, 2], np.hypot(self.lag[:, 0], self.lag[:, 1])))
+
+    def cone(self, direction, angle_tol=22.5):
+        """
+        Boolean mask of the pairs whose lag vector is within angle_tol degrees of direction (either sense), the
+        directional window of gs.vario_estimate (angles_tol, no bandwidth)
+        """
+        d = np.asarray(direction, dtype=float)
+        lag = self.lag.astype(float)
+        return np.abs(lag @ (d / np.linalg.norm(d))) >= np.cos(np.radians(angle_tol)) * np.sqrt((lag ** 2).sum(axis=1))
+
+    def horizontal_cones(self, angles, bin_edges, angle_tol=22.5, sq=None):
+        """
+        Matheron semivariances for many horizontal directions at once, counting for each azimuth exactly the pairs
+        of cone([cos, sin, 0], angle_tol). A pair at dip d is within the cone of azimuth a when
+        |cos(azimuth - a)| >= cos(angle_tol) / cos(d), i.e. it covers an azimuth interval of half-width
+        arccos(cos(angle_tol) / cos(d)) (none when |d| > angle_tol, so within-log pairs never count). The
+        intervals are swept over the sorted azimuths with a difference array.
+
+        Parameters:
+            angles: azimuth(s) in degrees
+            bin_edges: lag bin edges (up to max_lag)
+            angle_tol: cone half-angle in degrees
+            sq: optional per-pair semivariances to use instead of those from set_values
+        Returns:
+            bin_center, gamma (ndir, nbins) with NaN for empty bins, counts (ndir, nbins)
+        """
+        sq = self.sq if sq is None else sq
+        edges = np.asarray(bin_edges, dtype=float)
+        nb = len(edges) - 1
+        angles = np.mod(np.atleast_1d(np.asarray(angles, dtype=float)), 180.0)
+        order = np.argsort(angles)
+        sorted_angles = angles[order]
+
+        #-- Azimuth half-width of each pair's cone membership
+        lag = self.lag.astype(float)
+        h = np.hypot(lag[:, 0], lag[:, 1])
+        lag_idx = np.searchsorted(edges, np.sqrt(h ** 2 + lag[:, 2] ** 2), side='right') - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cos_w = np.cos(np.radians(angle_tol)) * np.sqrt(h ** 2 + lag[:, 2] ** 2) / h
+        keep = (lag_idx >= 0) & (lag_idx < nb) & (h > 0) & (cos_w <= 1.0)
+        az, lag_idx, w = self.azimuth()[keep].astype(float), lag_idx[keep], np.degrees(np.arccos(cos_w[keep]))
+        vals = sq[keep].astype(float)
+
+        #-- Covered azimuth intervals [az - w, az + w], wrapped into [0, 180), as ranges of the sorted angles
+        lo, hi = az - w, az + w
+        pieces = [(np.maximum(lo, 0.0), np.minimum(hi, 180.0), np.ones(len(az), dtype=bool)),
+                  (lo + 180.0, np.full(len(az), 180.0), lo < 0),
+                  (np.zeros(len(az)), hi - 180.0, hi >= 180.0)]
+        diff = [np.zeros((len(angles) + 1) * nb) for _ in range(2)]
+        for a0, a1, m in pieces:
+            start = np.searchsorted(sorted_angles, a0[m], side='left')
+            stop = np.searchsorted(sorted_angles, a1[m], side='right')
+            for d, wgt in zip(diff, (vals[m], np.ones(m.sum()))):
+                d += np.bincount(start * nb + lag_idx[m], weights=wgt, minlength=len(d))
+                d -= np.bincount(stop * nb + lag_idx[m], weights=wgt, minlength=len(d))
+        sums, counts = np.zeros((2, len(angles), nb))
+        sums[order], counts[order] = [np.cumsum(d.reshape(len(angles) + 1, nb), axis=0)[:-1] for d in diff]
+        counts = np.rint(counts).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gamma = np.where(counts > 0, sums / counts, np.nan)
+        return (edges[:-1] + edges[1:]) / 2, gamma, counts
+
+    def directional(self, angles, bin_edges, angle_tol=22.5, dips=0.0, dip_tol=90.0, sq=None):
+        """
+        Matheron semivariances for many directions at once. A pair counts for a direction when its azimuth is
+        within angle_tol and its dip within dip_tol of the direction (GSLIB-style separate tolerances; use
+        angle_tol >= 90 for no azimuth restriction, e.g. vertical variograms).
+
+        Pairs are histogrammed once on the boundaries of all direction windows (and the lag bins); each direction
+        is then a sum of histogram boxes taken from prefix sums, so the cost barely depends on the number of
+        directions.
+
+        Parameters:
+            angles: azimuth(s) in degrees
+            bin_edges: lag bin edges (up to max_lag)
+            angle_tol: azimuth half-width in degrees
+            dips: dip(s) in degrees, broadcast with angles
+            dip_tol: dip half-width in degrees (90 = any dip)
+            sq: optional per-pair semivariances to use instead of those from set_values (e.g. resampled weights)
+        Returns:
+            bin_center, gamma (ndir, nbins) with NaN for empty bins, counts (ndir, nbins)
+        """
+        sq = self.sq if sq is None else sq
+        edges = np.asarray(bin_edges, dtype=float)
+        nb = len(edges) - 1
+        angles, dips = np.broadcast_arrays(np.atleast_1d(np.asarray(angles, dtype=float)),
+                                           np.atleast_1d(np.asarray(dips, dtype=float)))
+        #-- Directions in the same half-space as the pairs (azimuth in [0, 180))
+        back = np.mod(angles, 360.0) >= 180.0
+        angles = np.mod(angles, 180.0)
+        dips = np.where(back, -dips, dips)
+        free_az = angle_tol >= 90.0
+        dip_lo, dip_hi = np.clip(dips - dip_tol, -90, 90), np.clip(dips + dip_tol, -90, 90)
+
+        #-- Window boundaries as histogram edges
+        az_edges = np.unique(np.r_[0.0, 180.0] if free_az else
+                             np.r_[0.0, 180.0, np.mod(angles - angle_tol, 180.0), np.mod(angles + angle_tol, 180.0)])
+        dip_edges = np.unique(np.r_[-90.0, 90.0, dip_lo, dip_hi, -dip_lo, -dip_hi])
+        naz, ndip = len(az_edges) - 1, len(dip_edges) - 1
+
+        #-- One histogram of all pairs over (azimuth cell, dip cell, lag bin), as prefix sums over azimuth & dip
+        lag_idx = np.searchsorted(edges, self.distance(), side='right') - 1
+        keep = (lag_idx >= 0) & (lag_idx < nb)
+        az_idx = np.clip(np.searchsorted(az_edges, self.azimuth()[keep], side='right') - 1, 0, naz - 1)
+        dip_idx = np.clip(np.searchsorted(dip_edges, self.dip()[keep], side='right') - 1, 0, ndip - 1)
+        flat = (az_idx * ndip + dip_idx) * nb + lag_idx[keep]
+        prefix = []
+        for w in (sq[keep].astype(float), None):
+            h = np.bincount(flat, weights=w, minlength=naz * ndip * nb).reshape(naz, ndip, nb).astype(float)
+            p = np.zeros((naz + 1, ndip + 1, nb))
+            p[1:, 1:] = h.cumsum(axis=0).cumsum(axis=1)
+            prefix.append(p)
+
+        #-- Boxes (azimuth range x dip range) per direction; a window wrapping past 0/180 azimuth continues on
+        #-- the other side with mirrored dips
+        boxes = []
+        def add(k, a0, a1, d0, d1):
+            if a1 > a0 and d1 > d0:
+                boxes.append((k, np.searchsorted(az_edges, a0), np.searchsorted(az_edges, a1),
+                              np.searchsorted(dip_edges, d0), np.searchsorted(dip_edges, d1)))
+        for k, (a, lo, hi) in enumerate(zip(angles, dip_lo, dip_hi)):
+            if free_az:
+                if lo <= 0 <= hi:   # window and its mirror overlap
+                    add(k, 0.0, 180.0, min(lo, -hi), max(hi, -lo))
+                else:
+                    add(k, 0.0, 180.0, lo, hi)
+                    add(k, 0.0, 180.0, -hi, -lo)
+                continue
+            add(k, max(a - angle_tol, 0.0), min(a + angle_tol, 180.0), lo, hi)
+            if a - angle_tol < 0:
+                add(k, a - angle_tol + 180.0, 180.0, -hi, -lo)
+            if a + angle_tol > 180:
+                add(k, 0.0, a + angle_tol - 180.0, -hi, -lo)
+        k, a0, a1, d0, d1 = np.array(boxes, dtype=int).T
+        sums = []
+        for p in prefix:
+            box = p[a1, d1] - p[a0, d1] - p[a1, d0] + p[a0, d0]
+            total = np.zeros((len(angles), nb))
+            np.add.at(total, k, box)
+            sums.append(total)
+        counts = np.rint(sums[1]).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gamma = np.where(counts > 0, sums[0] / counts, np.nan)
+        return (edges[:-1] + edges[1:]) / 2, gamma, counts
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def direction_scan(index, angles, bin_edges, model='Exponential', angle_tol=22.5):
+    """
+    Principal direction scan: fits a model to the horizontal directional variogram at each azimuth.
+
+    Parameters:
+        index: PairIndex (with values set)
+        angles: azimuths in degrees, e.g. np.arange(0, 180, 2.5)
+        bin_edges: lag bin edges
+        model: gstools model name
+        angle_tol: cone half-angle in degrees (same pairs as PairIndex.cone and the horizontal step)
+    Returns:
+        DataFrame of angle, range (len_scale), r2, n_pairs, sorted by angle
+    """
+    bin_center, gamma, counts = index.horizontal_cones(angles, bin_edges, angle_tol=angle_tol)
+    rows = []
+    for angle, g, c in zip(np.atleast_1d(angles), gamma, counts):
+        ok = c > 0
+        fitted, r2 = _fit(model, bin_center[ok], g[ok])
+        rows.append({'angle': angle, 'range': fitted.len_scale, 'r2': r2, 'n_pairs': int(c.sum())})
+    return pd.DataFrame(rows)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Bootstrap: wells (logs) are resampled with replacement. A replicate is a vector of log multiplicities w; a pair
+# between logs a != b counts w_a * w_b times, a within-log pair w_a times. Pairs are aggregated once by
+# (log a, log b, lag bin), so each replicate only re-weights these sums before refitting.
+# -------------------------------------------------------------------------------------------------------------------- #
+
+BOOT_PARAMS = ['nugget', 'sill', 'range_max', 'range_z', 'anis_z']
+
+def _refit(model, anis_xy, horizontal, vertical):
+    try:
+        model_aniso, anis_z, _, _, _ = _fit_final(model, anis_xy, horizontal, vertical)
+    except (RuntimeError, ValueError):
+        return dict.fromkeys(BOOT_PARAMS, np.nan)
+    return {'nugget': model_aniso.nugget, 'sill': model_aniso.var, 'range_max': model_aniso.len_scale,
+            'range_z': model_aniso.len_scale * anis_z, 'anis_z': anis_z}
+
+def _bootstrap_chunk(args):
+    h, z, model, anis_xy, well_weights = args
+    rows = []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for w in well_weights:
+            pw = np.where(h['wa'] == h['wb'], w[h['wa']], w[h['wa']] * w[h['wb']])
+            h_gamma = (np.bincount(h['bin'], weights=h['sq'] * pw, minlength=len(h['center'])) /
+                       np.bincount(h['bin'], weights=h['count'] * pw, minlength=len(h['center'])))
+            z_gamma = (z['sums'] @ w) / (2.0 * (z['counts'] @ w))
+            rows.append(_refit(model, anis_xy, (h['center'], h_gamma), (z['center'], z_gamma)))
+    return rows
+
+def bootstrap_texture(fit, pos, values, config=DEFAULT_CONFIG, n_boot=200, seed=None, processes=None):
+    """
+    Well bootstrap of the final variogram parameters of fit_texture. The empirical variograms are those of
+    fit_texture, built once: the horizontal step's pairs (horizontal_pairs: same pair index, cone and bins)
+    aggregated by (log a, log b, lag bin), and the exact within-log vertical sums per log. The estimate from all
+    wells is recomputed the same way and checked against the fit_texture parameters.
+
+    Parameters:
+        fit: fit_texture result of this texture (same config)
+        pos, values: as fit_texture
+        config: texture config; the vertical step must use the 'logs' estimator
+        n_boot: number of replicates
+        seed: random seed for the resampling
+        processes: worker processes (default: all cores). 1 runs in this process.
+    Returns:
+        estimate (dict of parameters from all wells, equal to fit's), replicates (DataFrame, one row per replicate)
+    """
+    if config['vertical'].get('estimator') != 'logs':
+        raise ValueError("The well bootstrap needs the vertical 'logs' estimator")
+    pos = np.asarray(pos, dtype=float)
+    well = log_ids(pos)
+    nw = well.max() + 1
+    model, anis_xy = config['model'], config['anis_xy']
+
+    #-- Empirical variograms and estimate from all wells, as in fit_texture
+    index, pairs, lag_bin, edges = horizontal_pairs(pos, values, config['horizontal'], config.get('seed'),
+                                                    fit['principal_angle'], _scan_index(pos, values, config))
+    horizontal = binned_gamma(lag_bin, index.sq[pairs], edges)
+    vertical = _estimate(pos, values, config['vertical'], config.get('seed'))
+    estimate = _refit(model, anis_xy, horizontal, vertical)
+    mismatch = [p for p in BOOT_PARAMS if not np.isclose(estimate[p], fit[p], rtol=1e-9, equal_nan=True)]
+    if mismatch:
+        raise ValueError(f"Bootstrap estimate of {fit['texture']} differs from the fit_texture result ({mismatch}); "
+                         f"was the fit run with the same config?")
+
+    #-- Horizontal pairs aggregated by (log a, log b, lag bin)
+    wa, wb = well[index.sample][index.i[pairs]], well[index.sample][index.j[pairs]]
+    keys, inv = np.unique(np.column_stack([np.minimum(wa, wb), np.maximum(wa, wb), lag_bin]), axis=0,
+                          return_inverse=True)
+    inv = inv.ravel()
+    h = {'wa': keys[:, 0], 'wb': keys[:, 1], 'bin': keys[:, 2], 'center': horizontal[0],
+         'sq': np.bincount(inv, weights=index.sq[pairs].astype(float)), 'count': np.bincount(inv).astype(float)}
+
+    #-- Vertical: exact within-log sums per log
+    z_edges = np.linspace(*config['vertical']['bin_edges'])
+    sums, counts = vertical_log_sums(pos, values, z_edges, well)
+    z = {'sums': sums, 'counts': counts, 'center': vertical[0]}
+
+    #-- Replicates in a process pool
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(nw, np.full(nw, 1.0 / nw), size=n_boot).astype(float)
+    processes = min(processes or os.cpu_count() or 1, n_boot)
+    chunks = [(h, z, model, anis_xy, w) for w in np.array_split(weights, max(processes, 1))]
+    if processes <= 1:
+        rows = [row for chunk in chunks for row in _bootstrap_chunk(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            rows = [row for chunk_rows in pool.map(_bootstrap_chunk, chunks) for row in chunk_rows]
+    replicates = pd.DataFrame(rows, columns=BOOT_PARAMS)
+    replicates.insert(0, 'texture', fit['texture'])
+    return estimate, replicates
+
+def bootstrap_summary(tex, estimate, replicates, ci=95.0):
+    """ Estimate, bootstrap mean/std and percentile confidence interval per parameter """
+    lo, hi = (100.0 - ci) / 2, 100.0 - (100.0 - ci) / 2
+    rows = []
+    for param in BOOT_PARAMS:
+        vals = replicates[param].dropna().to_numpy()
+        rows.append({'texture': tex, 'param': param, 'estimate': estimate[param],
+                     'boot_mean': vals.mean() if len(vals) else np.nan,
+                     'boot_std': vals.std(ddof=1) if len(vals) > 1 else np.nan,
+                     f'ci{ci:g}_lo': np.percentile(vals, lo) if len(vals) else np.nan,
+                     f'ci{ci:g}_hi': np.percentile(vals, hi) if len(vals) else np.nan,
+                     'n_ok': len(vals)})
+    return pd.DataFrame(rows)
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def variogram_table(results):
+    """ One row per texture of fitted parameters (no empirical variograms) """
+    return pd.DataFrame([{k: v for k, v in r.items() if k not in ('empirical', 'explore', 'scan')} for r in results])
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+def write_t2p_variograms(table, filename, nnear=300, class_names=None):
+    """
+    Writes a Texture2Par VARIOGRAMS block (as in 05_Outputs/fitted_variograms.txt) from variogram_table output.
+
+    Parameters:
+        table: variogram_table DataFrame
+        filename: output file
+        nnear: number of nearest neighbours written for every class
+        class_names: {texture: T2P class name} (default: texture.title(), e.g. MIXED_FINE -> Mixed_Fine)
+    """
+    lines = ['BEGIN VARIOGRAMS',
+             '  # Structure Vtype  Nugget  Sill  Range_min Range_max ang1  nnear']
+    for row in table.itertuples():
+        name = (class_names or {}).get(row.texture, row.texture.title())
+        lines.append(f'  CLASS {name}')
+        lines.append(f'           1    {T2P_VTYPES.get(row.model, row.model)}    {row.nugget:.3f}   {row.sill:.3f}'
+                     f'    {row.range_min:.2E}       {row.range_max:.2E}  0.0    {nnear}')
+    lines.append('END VARIOGRAMS')
+    Path(filename).write_text('\n'.join(lines) + '\n')
+
+# -------------------------------------------------------------------------------------------------------------------- #